@@ -0,0 +1 @@
+"""Load tests and micro-benchmarks; run from the repository root with `python -m benchmarks.<name>`."""
@@ -0,0 +1,85 @@
+# common.py
+import json
+import datetime
+import platform
+import subprocess
+from typing import Dict, List, Optional
+import numpy as np
+
+
+def summarize(latencies: List[float], elapsed: Optional[float] = None) -> Dict[str, float]:
+    """Latency percentiles in milliseconds (plus throughput when the wall time is given)"""
+    if not latencies:
+        return {"count": 0}
+    ms = np.asarray(latencies) * 1000.0
+    summary = {
+        "count": len(latencies),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+    if elapsed:
+        summary["per_second"] = round(len(latencies) / elapsed, 3)
+    return summary
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(**params) -> dict:
+    """Identifies a run so results from different commits can be compared"""
+    return {
+        "commit": git_revision(),
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": params,
+    }
+
+
+def _flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(baseline: dict, current: dict) -> Dict[str, dict]:
+    """Relative change of every numeric result present in both runs"""
+    skipped = ("metadata", "comparison")
+    before = _flatten({k: v for k, v in baseline.items() if k not in skipped})
+    after = _flatten({k: v for k, v in current.items() if k not in skipped})
+    changes = {}
+    for key in sorted(before.keys() & after.keys()):
+        if before[key]:
+            changes[key] = {
+                "baseline": before[key],
+                "current": after[key],
+                "change_pct": round((after[key] - before[key]) / before[key] * 100.0, 1),
+            }
+    return changes
+
+
+def write_results(results: dict, output: Optional[str], baseline: Optional[str] = None):
+    """Print or save the results as JSON, with a comparison against a baseline run if given"""
+    if baseline:
+        with open(baseline) as f:
+            results["comparison"] = compare(json.load(f), results)
+    text = json.dumps(results, indent=2, default=str)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+        print(f"✅ Results written to {output}")
+    else:
+        print(text)
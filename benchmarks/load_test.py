@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Load Test for RAG Q&A System
+Starts the app under uvicorn against local stand-ins (fake Ollama with
+configurable token latency, in-memory Qdrant, mock MongoDB), ingests a
+synthetic upload workload, then replays questions from a JSONL file at a fixed
+concurrency. Reports p50/p95/p99 latency, requests per second and per-stage
+breakdowns as JSON so runs can be compared across commits.
+
+Usage: python -m benchmarks.load_test --requests requests.jsonl --concurrency 8 --output run.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+
+from benchmarks import standins
+from benchmarks.common import run_metadata, summarize, write_results
+
+VOCABULARY_SIZE = 2000
+
+
+def load_questions(path: Optional[str], vocabulary: List[str], count: int, rng: random.Random) -> List[str]:
+    """
+    Questions from a JSONL file: the "question" field of each record, or the
+    "title" of records without one. Falls back to synthetic questions.
+    """
+    questions = []
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    question = record.get("question") or record.get("title")
+                    if question:
+                        questions.append(str(question))
+    if not questions:
+        questions = [f"What does the document say about {rng.choice(vocabulary)} and {rng.choice(vocabulary)}?"
+                     for _ in range(count)]
+    return questions
+
+
+def synthetic_document(rng: random.Random, vocabulary: List[str], words: int) -> str:
+    lines = []
+    for start in range(0, words, 15):
+        lines.append(" ".join(rng.choice(vocabulary) for _ in range(min(15, words - start))) + ".")
+    return "\n".join(lines)
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Server-Timing header -> {stage: seconds}; stages timed more than once (e.g. llm_queue) are summed"""
+    stages = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "dur" and name:
+                stages[name] = stages.get(name, 0.0) + float(value) / 1000.0
+    return stages
+
+
+async def run_pool(count: int, concurrency: int, task) -> float:
+    """Run task(0..count-1) with at most `concurrency` in flight; returns wall time"""
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < count:
+            index = next_index
+            next_index += 1
+            await task(index)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, count)))))
+    return time.perf_counter() - started
+
+
+async def upload_workload(client, args, rng: random.Random, vocabulary: List[str]) -> dict:
+    request_latencies, job_latencies = [], []
+    errors = 0
+    documents = [synthetic_document(rng, vocabulary, args.upload_words) for _ in range(args.uploads)]
+
+    async def upload(index: int):
+        nonlocal errors
+        started = time.perf_counter()
+        response = await client.post("/upload", files={"file": (f"bench_{index}.txt", documents[index].encode())})
+        request_latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors += 1
+            return
+        status_url = response.json()["status_url"]
+        while True:
+            status = (await client.get(status_url)).json()
+            if status["status"] in ("completed", "failed"):
+                break
+            await asyncio.sleep(0.005)
+        if status["status"] == "failed":
+            errors += 1
+        job_latencies.append(time.perf_counter() - started)
+
+    elapsed = await run_pool(args.uploads, args.upload_concurrency, upload)
+    return {
+        "requests": summarize(request_latencies, elapsed),
+        "jobs": summarize(job_latencies, elapsed),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+    }
+
+
+async def ask_workload(client, args, questions: List[str]) -> dict:
+    endpoint = "/ask/stream" if args.stream else "/ask"
+    latencies, first_bytes = [], []
+    stages: Dict[str, List[float]] = {}
+    errors = rejected = 0
+
+    async def ask(index: int):
+        nonlocal errors, rejected
+        body = {"user_id": f"bench-user-{index % args.users}", "question": questions[index % len(questions)],
+                "top_k": args.top_k}
+        started = time.perf_counter()
+        if args.stream:
+            async with client.stream("POST", endpoint, json=body) as response:
+                first_byte = None
+                async for _ in response.aiter_bytes():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                if first_byte is not None:
+                    first_bytes.append(first_byte)
+        else:
+            response = await client.post(endpoint, json=body)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code in (429, 503):
+            rejected += 1  # turned away by LLM admission control
+        elif response.status_code != 200:
+            errors += 1
+        for stage, seconds in parse_server_timing(response.headers.get("server-timing")).items():
+            stages.setdefault(stage, []).append(seconds)
+
+    elapsed = await run_pool(args.iterations, args.concurrency, ask)
+    results = {
+        "endpoint": endpoint,
+        "latency": summarize(latencies, elapsed),
+        "errors": errors,
+        "rejected": rejected,
+        "elapsed_seconds": round(elapsed, 3),
+        "stages": {stage: summarize(values) for stage, values in stages.items()},
+    }
+    if args.stream:
+        results["first_byte"] = summarize(first_bytes)
+    return results
+
+
+def server_stage_means() -> Dict[str, Dict[str, dict]]:
+    """Mean stage latencies from the app's own histograms, including background ingestion"""
+    from services.metrics import STAGE_LATENCY
+
+    totals: Dict[tuple, dict] = {}
+    for metric in STAGE_LATENCY.collect():
+        for sample in metric.samples:
+            key = (sample.labels.get("endpoint"), sample.labels.get("stage"))
+            if sample.name.endswith("_sum"):
+                totals.setdefault(key, {})["sum"] = sample.value
+            elif sample.name.endswith("_count"):
+                totals.setdefault(key, {})["count"] = sample.value
+
+    means: Dict[str, Dict[str, dict]] = {}
+    for (endpoint, stage), values in sorted(totals.items()):
+        count = int(values.get("count", 0))
+        if count:
+            means.setdefault(endpoint, {})[stage] = {
+                "count": count,
+                "mean_ms": round(values.get("sum", 0.0) / count * 1000.0, 3),
+            }
+    return means
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(args) -> dict:
+    import httpx
+    import uvicorn
+    import main
+
+    rng = random.Random(args.seed)
+    vocabulary = [f"term{i}" for i in range(VOCABULARY_SIZE)]
+    questions = load_questions(args.requests, vocabulary, args.iterations, rng)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300) as client:
+            while not server.started:
+                await asyncio.sleep(0.01)
+            while (await client.get("/readyz")).status_code != 200:
+                await asyncio.sleep(0.05)
+
+            print(f"📥 Uploading {args.uploads} synthetic documents...", file=sys.stderr)
+            upload_results = await upload_workload(client, args, rng, vocabulary)
+            print(f"🔄 Replaying {args.iterations} questions at concurrency {args.concurrency}...", file=sys.stderr)
+            ask_results = await ask_workload(client, args, questions)
+    finally:
+        server.should_exit = True
+        await server_task
+
+    return {
+        "upload": upload_results,
+        "ask": ask_results,
+        "server_stages": server_stage_means(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay questions and uploads against the app with local stand-ins.")
+    parser.add_argument("--requests", default="requests.jsonl", help="JSONL file of questions to replay")
+    parser.add_argument("--iterations", type=int, default=200, help="number of questions to send")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=16, help="distinct user_ids to spread questions over")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--stream", action="store_true", help="use /ask/stream instead of /ask")
+    parser.add_argument("--uploads", type=int, default=20, help="synthetic TXT documents to ingest first")
+    parser.add_argument("--upload-words", type=int, default=2000)
+    parser.add_argument("--upload-concurrency", type=int, default=4)
+    parser.add_argument("--tokens", type=int, default=64, help="tokens generated per fake LLM call")
+    parser.add_argument("--token-latency-ms", type=float, default=10.0)
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--llm-backends", type=int, default=1, help="fake Ollama servers behind the LLM gateway")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache enabled")
+    parser.add_argument("--fake-embeddings", action="store_true", help="use hash-based vectors instead of the model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results JSON here instead of stdout")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE_SIZE"] = "0"
+    standins.install(
+        tokens=args.tokens,
+        token_latency=args.token_latency_ms / 1000.0,
+        first_token_latency=args.first_token_ms / 1000.0,
+        fake_embeddings=args.fake_embeddings,
+        llm_backends=args.llm_backends
+    )
+
+    results = {"metadata": run_metadata(**vars(args))}
+    results.update(asyncio.run(run(args)))
+    write_results(results, args.output, args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
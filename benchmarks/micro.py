@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for RAG Q&A System
+Times the CPU-bound building blocks in isolation: chunk_text,
+extract_text_from_pdf (process pool and single process) and the embedding
+model at several batch sizes. Results are printed as JSON.
+
+Usage: python -m benchmarks.micro [--pdf file.pdf] [--only chunk_text pdf embedding]
+"""
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+from typing import Callable
+
+from benchmarks.common import run_metadata, summarize, write_results
+from benchmarks.standins import FakeEmbeddingModel, set_environment_defaults
+
+BENCHMARKS = ("chunk_text", "pdf", "embedding")
+
+
+def measure(fn: Callable, repeats: int, warmup: int = 1) -> list:
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def with_rate(summary: dict, units: int, unit: str) -> dict:
+    """Add a units-per-second figure based on the median run"""
+    if summary.get("p50_ms"):
+        summary[f"{unit}_per_second"] = round(units / (summary["p50_ms"] / 1000.0), 1)
+    return summary
+
+
+def synthetic_text(words: int, seed: int) -> str:
+    rng = random.Random(seed)
+    return " ".join(f"term{rng.randrange(5000)}" for _ in range(words))
+
+
+def bench_chunk_text(args) -> dict:
+    from utils.util_module import chunk_text
+
+    text = synthetic_text(args.words, args.seed)
+    return with_rate(summarize(measure(lambda: chunk_text(text), args.repeats)), args.words, "words")
+
+
+def bench_pdf(args) -> dict:
+    from utils.util_module import extract_text_from_pdf
+    from utils.pdf_extraction import count_pdf_pages, extract_page_range, shutdown_pdf_executor
+
+    pdf_path = args.pdf or next(iter(sorted(glob.glob("sampl_data/*.pdf"))), None)
+    if not pdf_path:
+        return {"skipped": "no PDF given and none found in sampl_data/"}
+    with open(pdf_path, "rb") as f:
+        content = f.read()
+    pages = count_pdf_pages(content)
+    try:
+        return {
+            "file": os.path.basename(pdf_path),
+            "pages": pages,
+            "process_pool": with_rate(summarize(measure(lambda: extract_text_from_pdf(content), args.repeats)),
+                                      pages, "pages"),
+            "single_process": with_rate(summarize(measure(lambda: extract_page_range(content, 0, pages), args.repeats)),
+                                        pages, "pages"),
+        }
+    finally:
+        shutdown_pdf_executor()
+
+
+def bench_embedding(args) -> dict:
+    import services.embeddings as embeddings
+    from utils.util_module import chunk_text
+
+    if args.fake_embeddings:
+        embeddings._embedding_model = FakeEmbeddingModel()
+    model = embeddings.get_embedding_model()
+    chunks = chunk_text(synthetic_text(max(args.words, 500 * max(args.batch_sizes)), args.seed))
+
+    results = {"runtime": "fake" if args.fake_embeddings else embeddings.EMBEDDING_RUNTIME}
+    for batch_size in args.batch_sizes:
+        batch = (chunks * (batch_size // len(chunks) + 1))[:batch_size]
+        results[f"batch_{batch_size}"] = with_rate(summarize(measure(lambda: model.encode(batch), args.repeats)),
+                                                   batch_size, "texts")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for chunking, PDF extraction and embedding.")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--words", type=int, default=100000, help="size of the synthetic text for chunk_text")
+    parser.add_argument("--pdf", help="PDF for the extraction benchmark (default: first file in sampl_data/)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--fake-embeddings", action="store_true", help="use hash-based vectors instead of the model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results JSON here instead of stdout")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    set_environment_defaults()
+    runners = {"chunk_text": bench_chunk_text, "pdf": bench_pdf, "embedding": bench_embedding}
+    results = {"metadata": run_metadata(**vars(args))}
+    for name in args.only:
+        print(f"🔄 Running {name}...", file=sys.stderr)
+        results[name] = runners[name](args)
+    write_results(results, args.output, args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,402 @@
+# standins.py
+# Local replacements for Ollama, Qdrant and MongoDB (including GridFS) so the app can be benchmarked
+# on one machine. install() must run before main (or any service module) is imported.
+import os
+import json
+import time
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional
+import numpy as np
+from bson import ObjectId
+from gridfs.errors import NoFile
+from langchain_core.language_models.llms import BaseLLM
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
+
+
+class FakeOllamaLLM(BaseLLM):
+    """
+    Stand-in for OllamaLLM that waits `first_token_latency` and then
+    `token_latency` per generated token, and reports token counts in the
+    same generation_info fields Ollama uses.
+    """
+
+    tokens: int = 64
+    token_latency: float = 0.01
+    first_token_latency: float = 0.05
+    json_mode: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-ollama"
+
+    def _tokens(self) -> List[str]:
+        if self.json_mode:
+            words = " ".join(f"word{i}" for i in range(max(self.tokens - 8, 1)))
+            return [json.dumps({
+                "answer": words,
+                "reasoning": "The context states it directly.",
+                "suggestions": ["What else?", "Why?", "How?"]
+            })]
+        return [f"word{i}{chr(10) if i % 12 == 11 else ' '}" for i in range(self.tokens)]
+
+    def _generation_info(self, prompt: str) -> dict:
+        return {"done": True, "prompt_eval_count": len(prompt.split()), "eval_count": self.tokens}
+
+    def _total_latency(self) -> float:
+        return self.first_token_latency + self.token_latency * self.tokens
+
+    def _generate(self, prompts: List[str], stop=None, run_manager=None, **kwargs) -> LLMResult:
+        generations = []
+        for prompt in prompts:
+            time.sleep(self._total_latency())
+            generations.append([Generation(text="".join(self._tokens()), generation_info=self._generation_info(prompt))])
+        return LLMResult(generations=generations)
+
+    async def _agenerate(self, prompts: List[str], stop=None, run_manager=None, **kwargs) -> LLMResult:
+        generations = []
+        for prompt in prompts:
+            await asyncio.sleep(self._total_latency())
+            generations.append([Generation(text="".join(self._tokens()), generation_info=self._generation_info(prompt))])
+        return LLMResult(generations=generations)
+
+    async def _astream(self, prompt: str, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token_latency)
+        tokens = self._tokens()
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            last = i == len(tokens) - 1
+            chunk = GenerationChunk(text=token, generation_info=self._generation_info(prompt) if last else None)
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class FakeEmbeddingModel:
+    """Deterministic hash-seeded vectors, for running without the real model"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, **kwargs):
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vectors[i] = np.random.default_rng(seed).standard_normal(self.dim)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+# -- MongoDB -------------------------------------------------------------------
+
+def _get_field(doc: dict, key: str):
+    value = doc
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _matches_condition(value, condition) -> bool:
+    if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+        for op, operand in condition.items():
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+            if op == "$ne" and value == operand:
+                return False
+            if op == "$exists" and (value is not None) != operand:
+                return False
+            if op in ("$lt", "$lte", "$gt", "$gte"):
+                if value is None:
+                    return False
+                if op == "$lt" and not value < operand:
+                    return False
+                if op == "$lte" and not value <= operand:
+                    return False
+                if op == "$gt" and not value > operand:
+                    return False
+                if op == "$gte" and not value >= operand:
+                    return False
+        return True
+    return value == condition
+
+
+def _matches(doc: dict, query: Optional[dict]) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(_matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(_matches(doc, sub) for sub in condition):
+                return False
+        elif not _matches_condition(_get_field(doc, key), condition):
+            return False
+    return True
+
+
+def _project(doc: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return dict(doc)
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        result = {k: doc[k] for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    return {k: v for k, v in doc.items() if projection.get(k, 1)}
+
+
+class MockCursor:
+    def __init__(self, docs: List[dict], projection: Optional[dict]):
+        self._docs = docs
+        self._projection = projection
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key, direction: int = 1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            present = [d for d in self._docs if _get_field(d, field) is not None]
+            missing = [d for d in self._docs if _get_field(d, field) is None]
+            present.sort(key=lambda d: _get_field(d, field), reverse=order < 0)
+            # Missing values sort as null: first ascending, last descending
+            self._docs = missing + present if order > 0 else present + missing
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    async def to_list(self, length: Optional[int] = None):
+        docs = self._docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        if length:
+            docs = docs[:length]
+        return [_project(d, self._projection) for d in docs]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in await self.to_list():
+            yield doc
+
+
+class MockResult:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class MockCollection:
+    """In-memory subset of pymongo's AsyncCollection API used by the app"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.docs: List[dict] = []
+        self._ids = 0
+
+    def _with_id(self, doc: dict) -> dict:
+        doc = dict(doc)
+        if "_id" not in doc:
+            self._ids += 1
+            doc["_id"] = self._ids
+        return doc
+
+    async def create_index(self, keys, **kwargs):
+        return str(keys)
+
+    def find(self, query: Optional[dict] = None, projection: Optional[dict] = None):
+        return MockCursor([d for d in self.docs if _matches(d, query)], projection)
+
+    async def find_one(self, query: Optional[dict] = None, projection: Optional[dict] = None):
+        for doc in self.docs:
+            if _matches(doc, query):
+                return _project(doc, projection)
+        return None
+
+    async def count_documents(self, query: Optional[dict] = None):
+        return sum(1 for d in self.docs if _matches(d, query))
+
+    async def insert_one(self, doc: dict):
+        doc = self._with_id(doc)
+        self.docs.append(doc)
+        return MockResult(inserted_id=doc["_id"])
+
+    async def insert_many(self, docs: List[dict], ordered: bool = True):
+        docs = [self._with_id(d) for d in docs]
+        self.docs.extend(docs)
+        return MockResult(inserted_ids=[d["_id"] for d in docs])
+
+    async def replace_one(self, query: dict, doc: dict, upsert: bool = False):
+        for i, existing in enumerate(self.docs):
+            if _matches(existing, query):
+                self.docs[i] = dict(doc, _id=existing["_id"])
+                return MockResult(matched_count=1, upserted_id=None)
+        if upsert:
+            await self.insert_one(doc)
+        return MockResult(matched_count=0, upserted_id=None)
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        for doc in self.docs:
+            if _matches(doc, query):
+                doc.update(update.get("$set", {}))
+                return MockResult(matched_count=1)
+        if upsert:
+            await self.insert_one({**{k: v for k, v in query.items() if not k.startswith("$")},
+                                   **update.get("$setOnInsert", {}), **update.get("$set", {})})
+        return MockResult(matched_count=0)
+
+    async def bulk_write(self, requests, ordered: bool = True):
+        for request in requests:
+            # pymongo's ReplaceOne keeps its arguments in private attributes
+            await self.replace_one(request._filter, request._doc, upsert=request._upsert)
+        return MockResult(acknowledged=True)
+
+    async def delete_one(self, query: dict):
+        for i, doc in enumerate(self.docs):
+            if _matches(doc, query):
+                del self.docs[i]
+                return MockResult(deleted_count=1)
+        return MockResult(deleted_count=0)
+
+    async def delete_many(self, query: dict):
+        before = len(self.docs)
+        self.docs = [d for d in self.docs if not _matches(d, query)]
+        return MockResult(deleted_count=before - len(self.docs))
+
+
+class MockDatabase:
+    def __init__(self):
+        self._collections: Dict[str, MockCollection] = {}
+
+    def __getitem__(self, name: str) -> MockCollection:
+        if name not in self._collections:
+            self._collections[name] = MockCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> MockCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, name: str, *args, **kwargs):
+        return {"ok": 1.0}
+
+
+class MockGridIn:
+    def __init__(self, files: Dict[Any, bytes], filename: str):
+        self._files = files
+        self._buffer = bytearray()
+        self._id = ObjectId()
+        self.filename = filename
+        self.length = 0
+
+    async def write(self, data: bytes):
+        self._buffer.extend(data)
+
+    async def close(self):
+        self._files[self._id] = bytes(self._buffer)
+        self.length = len(self._buffer)
+
+    async def abort(self):
+        self._buffer.clear()
+
+
+class MockGridOut:
+    def __init__(self, data: bytes, chunk_size: int = 255 * 1024):
+        self._chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+    async def readchunk(self) -> bytes:
+        return self._chunks.pop(0) if self._chunks else b""
+
+
+class MockGridFSBucket:
+    """In-memory subset of gridfs.AsyncGridFSBucket used for stored originals"""
+
+    def __init__(self):
+        self.files: Dict[Any, bytes] = {}
+
+    def open_upload_stream(self, filename: str, metadata: Optional[dict] = None):
+        return MockGridIn(self.files, filename)
+
+    async def open_download_stream(self, file_id):
+        if file_id not in self.files:
+            raise NoFile(file_id)
+        return MockGridOut(self.files[file_id])
+
+    async def delete(self, file_id):
+        if self.files.pop(file_id, None) is None:
+            raise NoFile(file_id)
+
+
+class MockMongoClient:
+    """In-memory stand-in for pymongo's AsyncMongoClient"""
+
+    def __init__(self):
+        self._databases: Dict[str, MockDatabase] = {}
+
+    def __getitem__(self, name: str) -> MockDatabase:
+        if name not in self._databases:
+            self._databases[name] = MockDatabase()
+        return self._databases[name]
+
+    def __getattr__(self, name: str) -> MockDatabase:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+# -- installation --------------------------------------------------------------
+
+def set_environment_defaults():
+    """Settings that make config importable without a .env and keep runs free of on-disk state"""
+    os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+    os.environ.setdefault("OLLAMA_MODEL", "fake")
+    os.environ.setdefault("VECTOR_STORE_BACKEND", "qdrant")
+    os.environ.setdefault("EMBEDDING_CACHE_DIR", "")
+    os.environ.setdefault("KEYWORD_INDEX_DIR", "")
+    os.environ.setdefault("SERVER_TIMING_HEADER", "true")
+
+
+def install(tokens: int = 64, token_latency: float = 0.01, first_token_latency: float = 0.05,
+            fake_embeddings: bool = False, llm_backends: int = 1) -> Dict[str, Any]:
+    """
+    Point the app at the stand-ins. Sets benchmark-friendly environment
+    defaults, then swaps the clients in `config` before the services import them.
+    """
+    set_environment_defaults()
+
+    from qdrant_client import AsyncQdrantClient
+    import config
+
+    llm_settings = dict(tokens=tokens, token_latency=token_latency, first_token_latency=first_token_latency)
+    config.async_mongo_client = MockMongoClient()
+    config.async_qdrant_client = AsyncQdrantClient(location=":memory:")
+    config.ollama_llms = [FakeOllamaLLM(**llm_settings) for _ in range(llm_backends)]
+    config.ollama_json_llms = [FakeOllamaLLM(json_mode=True, **llm_settings) for _ in range(llm_backends)]
+    config.ollama_llm = config.ollama_llms[0]
+    config.ollama_json_llm = config.ollama_json_llms[0]
+
+    import services.document_store as document_store
+
+    document_store._bucket = MockGridFSBucket()
+
+    if fake_embeddings:
+        import services.embeddings as embeddings
+
+        model = FakeEmbeddingModel()
+        embeddings.embedding_cache.open(model.get_sentence_embedding_dimension())
+        embeddings._embedding_model = model
+
+    return {"llm": llm_settings, "fake_embeddings": fake_embeddings, "llm_backends": llm_backends}
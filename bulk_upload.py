@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Bulk Upload Script for RAG Q&A System
+Submits PDF/TXT files, directories and zip/tar archives to a running server's
+/upload/bulk endpoint and follows the ingestion job, so the server's answer
+cache, keyword index and suggestion queue stay in step with the new chunks.
+
+With --direct the files are ingested in this process instead; only use it
+while the server is stopped, since the two would otherwise write the same
+indexes without seeing each other's changes.
+
+Usage: python bulk_upload.py [--server URL] <path> [<path> ...]
+"""
+import os
+import sys
+import shutil
+import asyncio
+import argparse
+import tempfile
+from contextlib import ExitStack
+
+import httpx
+
+from utils.file_types import ARCHIVE_EXTENSIONS, SUPPORTED_EXTENSIONS
+
+DEFAULT_SERVER_URL = os.getenv("RAG_SERVER_URL", "http://localhost:8000")
+
+
+def collect_files(paths):
+    """(filename, path) of every PDF/TXT file or archive under the given paths; directories are walked"""
+    files = []
+    for path in paths:
+        path = os.path.normpath(path)
+        if os.path.isdir(path):
+            parent = os.path.dirname(path)
+            for root, _, names in sorted(os.walk(path)):
+                for name in sorted(names):
+                    file_path = os.path.join(root, name)
+                    if name.endswith(SUPPORTED_EXTENSIONS + ARCHIVE_EXTENSIONS):
+                        files.append((os.path.relpath(file_path, parent).replace(os.sep, "/"), file_path))
+        elif path.endswith(SUPPORTED_EXTENSIONS + ARCHIVE_EXTENSIONS):
+            files.append((os.path.basename(path), path))
+    return files
+
+
+def print_progress(status: dict):
+    print(f"🔄 {status['files_processed']}/{status['files_total']} files, "
+          f"{status['pages_processed']} pages, {status['chunks_processed']} chunks "
+          f"({status['chunks_per_second']} chunks/s)")
+
+
+def print_result(status: dict) -> bool:
+    for failed in status["files_failed"]:
+        print(f"⚠️ Skipped {failed['filename']}: {failed['error']}")
+    if status["status"] != "completed":
+        print(f"❌ Bulk upload failed: {status['error']}")
+        return False
+
+    print(f"✅ Ingested {status['files_processed'] - len(status['files_failed'])} files, "
+          f"{status['pages_processed']} pages, {status['chunks_processed']} chunks "
+          f"in {status['elapsed_seconds']}s ({status['chunks_per_second']} chunks/s)")
+    return True
+
+
+async def submit_batch(client: httpx.AsyncClient, batch, progress_interval: float) -> bool:
+    """Upload one batch of files as a bulk job and wait for it to finish"""
+    with ExitStack() as stack:
+        files = [("files", (filename, stack.enter_context(open(path, "rb")))) for filename, path in batch]
+        response = await client.post("/upload/bulk", files=files, timeout=None)
+    if response.status_code != 200:
+        print(f"❌ Upload rejected ({response.status_code}): {response.json().get('detail', response.text)}")
+        return False
+
+    status_url = response.json()["status_url"]
+    while True:
+        await asyncio.sleep(progress_interval)
+        response = await client.get(status_url)
+        response.raise_for_status()
+        status = response.json()
+        if status["status"] in ("completed", "failed"):
+            return print_result(status)
+        print_progress(status)
+
+
+async def bulk_upload(server_url: str, paths, progress_interval: float, files_per_request: int) -> bool:
+    files = collect_files(paths)
+    if not files:
+        print("❌ No PDF or TXT files found.")
+        return False
+    print(f"📥 Submitting {len(files)} files to {server_url}...")
+
+    ok = True
+    async with httpx.AsyncClient(base_url=server_url, timeout=30) as client:
+        # Bounded batches keep the number of open files (and the request size) in check
+        for start in range(0, len(files), files_per_request):
+            ok = await submit_batch(client, files[start:start + files_per_request], progress_interval) and ok
+    return ok
+
+
+async def server_is_running(server_url: str) -> bool:
+    try:
+        async with httpx.AsyncClient(base_url=server_url, timeout=2) as client:
+            return (await client.get("/healthz")).status_code == 200
+    except httpx.HTTPError:
+        return False
+
+
+async def bulk_upload_direct(paths, progress_interval: float) -> bool:
+    """Ingest in this process; the server must not be running"""
+    from config import async_mongo_client
+    from services.ingestion import create_bulk_job, expand_sources, run_bulk_ingestion_job
+    from services.suggestions import suggestion_worker
+
+    async def report_progress(job):
+        while True:
+            await asyncio.sleep(progress_interval)
+            print_progress(job.to_dict())
+
+    workdir = tempfile.mkdtemp(prefix="rag_bulk_")
+    try:
+        items = [(os.path.basename(os.path.normpath(path)), path) for path in paths]
+        sources = expand_sources(items, workdir)
+        if not sources:
+            print("❌ No PDF or TXT files found.")
+            return False
+        print(f"📥 Ingesting {len(sources)} files...")
+
+        job = create_bulk_job(len(sources))
+        reporter = asyncio.create_task(report_progress(job))
+        try:
+            await run_bulk_ingestion_job(job, sources, async_mongo_client.rag_system.documents)
+        finally:
+            reporter.cancel()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Queued follow-up suggestions would be lost when the event loop exits
+    if suggestion_worker.pending():
+        print(f"💡 Generating suggestions for {suggestion_worker.pending()} chunks...")
+        await suggestion_worker.drain()
+    await suggestion_worker.close()
+    return print_result(job.to_dict())
+
+
+async def run(args) -> bool:
+    if not args.direct:
+        return await bulk_upload(args.server, args.paths, args.progress_interval, args.files_per_request)
+    if await server_is_running(args.server):
+        print(f"❌ A server is running at {args.server}; stop it or upload without --direct.")
+        return False
+    return await bulk_upload_direct(args.paths, args.progress_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest documents into the RAG Q&A system")
+    parser.add_argument("paths", nargs="+", help="PDF/TXT files, directories or zip/tar archives")
+    parser.add_argument("--server", default=DEFAULT_SERVER_URL, help="Base URL of the running server")
+    parser.add_argument("--files-per-request", type=int, default=200, help="Files uploaded per bulk job")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress reports")
+    parser.add_argument("--direct", action="store_true",
+                        help="Ingest in this process instead of through the server (server must be stopped)")
+    args = parser.parse_args()
+
+    print("🚀 RAG Q&A System Bulk Upload")
+    print("=" * 50)
+    if not args.direct:
+        ok = asyncio.run(run(args))
+    else:
+        from utils.pdf_extraction import shutdown_pdf_executor
+        try:
+            ok = asyncio.run(run(args))
+        finally:
+            shutdown_pdf_executor()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Embedding Runtime Comparison for RAG Q&A System
+Encodes a sample corpus with each embedding runtime (torch, onnx, onnx-int8)
+and reports throughput plus parity with the reference (first) runtime:
+per-text cosine similarity and recall@k of the retrieved chunks.
+
+Usage: python compare_embeddings.py <path> [<path> ...] [--queries queries.txt]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_MODEL_PATH, EMBEDDING_ONNX_QUANTIZATION
+from utils.embedding_models import EMBEDDING_RUNTIMES, ensure_model_downloaded, load_embedding_model
+from utils.pdf_extraction import count_pdf_pages, extract_page_range
+from utils.util_module import chunk_text
+
+
+def load_corpus(paths):
+    """Chunk every PDF/TXT file under the given paths the same way ingestion does"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            files.append(path)
+
+    chunks = []
+    for file_path in files:
+        if file_path.lower().endswith(".pdf"):
+            pages = extract_page_range(file_path, 0, count_pdf_pages(file_path))
+        elif file_path.lower().endswith(".txt"):
+            with open(file_path, encoding="utf-8", errors="ignore") as f:
+                pages = [(f.read(), 1)]
+        else:
+            continue
+        for text, _ in pages:
+            chunks.extend(chunk_text(text))
+    return chunks
+
+
+def sample_queries(chunks, count: int, words: int = 12):
+    """Use the opening words of random chunks as stand-in questions"""
+    rng = random.Random(0)
+    picked = rng.sample(chunks, min(count, len(chunks)))
+    return [" ".join(chunk.split()[:words]) for chunk in picked]
+
+
+def encode(model, texts, batch_size: int):
+    return np.asarray(model.encode(texts, batch_size=batch_size, normalize_embeddings=True), dtype=np.float32)
+
+
+def top_k(corpus_vectors, query_vectors, k: int):
+    scores = query_vectors @ corpus_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def benchmark(runtime: str, chunks, queries, batch_size: int):
+    started = time.perf_counter()
+    model = load_embedding_model(EMBEDDING_MODEL_PATH, runtime, EMBEDDING_ONNX_QUANTIZATION)
+    load_seconds = time.perf_counter() - started
+
+    encode(model, chunks[:batch_size], batch_size)  # warm-up
+    started = time.perf_counter()
+    corpus_vectors = encode(model, chunks, batch_size)
+    encode_seconds = time.perf_counter() - started
+    query_vectors = encode(model, queries, batch_size)
+    return {
+        "runtime": runtime,
+        "load_seconds": load_seconds,
+        "texts_per_second": len(chunks) / encode_seconds if encode_seconds else 0.0,
+        "corpus": corpus_vectors,
+        "queries": query_vectors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding runtimes for speed and retrieval parity.")
+    parser.add_argument("paths", nargs="+", help="PDF/TXT files or directories used as the corpus")
+    parser.add_argument("--runtimes", nargs="+", default=list(EMBEDDING_RUNTIMES), choices=EMBEDDING_RUNTIMES,
+                        help="runtimes to compare; the first one is the reference")
+    parser.add_argument("--queries", help="file with one question per line (default: sampled from the corpus)")
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    chunks = load_corpus(args.paths)
+    if not chunks:
+        print("❌ No text found in the given paths.")
+        return 1
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = sample_queries(chunks, args.num_queries)
+    print(f"📚 {len(chunks)} chunks, {len(queries)} queries, model '{EMBEDDING_MODEL_NAME}'")
+
+    ensure_model_downloaded(EMBEDDING_MODEL_NAME, EMBEDDING_MODEL_PATH)
+    results = [benchmark(runtime, chunks, queries, args.batch_size) for runtime in args.runtimes]
+
+    reference = results[0]
+    reference_hits = top_k(reference["corpus"], reference["queries"], args.top_k)
+    print()
+    print(f"{'runtime':<10} {'load s':>7} {'texts/s':>9} {'speedup':>8} {'mean cos':>9} {'min cos':>8} {'recall@' + str(args.top_k):>9}")
+    for result in results:
+        cosines = np.sum(result["corpus"] * reference["corpus"], axis=1)
+        hits = top_k(result["corpus"], result["queries"], args.top_k)
+        recall = np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(hits, reference_hits)])
+        print(f"{result['runtime']:<10} {result['load_seconds']:>7.2f} {result['texts_per_second']:>9.1f} "
+              f"{result['texts_per_second'] / reference['texts_per_second']:>7.2f}x "
+              f"{cosines.mean():>9.4f} {cosines.min():>8.4f} {recall:>9.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
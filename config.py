@@ -1,7 +1,8 @@
 # settings, env vars
+from pymongo import AsyncMongoClient
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from dotenv import load_dotenv
 import os
 from langchain_ollama import OllamaLLM
@@ -16,20 +17,142 @@ qdrant_url = os.getenv("QDRANT_URL")
 qdrant_api_key = os.getenv("QDRANT_API_KEY")
 ollama_model = os.getenv("OLLAMA_MODEL")
 ollama_base_url = os.getenv("OLLAMA_BASE_URL")
+# Pool of Ollama servers serving the same model (comma-separated, defaults to OLLAMA_BASE_URL);
+# each call goes to the healthy server with the fewest generations in flight
+OLLAMA_BASE_URLS = [url.strip() for url in os.getenv("OLLAMA_BASE_URLS", ollama_base_url or "").split(",") if url.strip()]
+# Generate answer, reasoning and suggestions in one JSON-formatted call
+SINGLE_PASS_GENERATION = os.getenv("SINGLE_PASS_GENERATION", "false").lower() == "true"
+# Embedding model and runtime: "torch" (PyTorch), "onnx" or "onnx-int8" (dynamically quantized ONNX)
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBEDDING_MODEL_PATH = os.getenv("EMBEDDING_MODEL_PATH", "./" + EMBEDDING_MODEL_NAME.split("/")[-1])
+EMBEDDING_RUNTIME = os.getenv("EMBEDDING_RUNTIME", "torch")
+# Instruction set targeted by the int8 export: "avx2", "avx512", "avx512_vnni" or "arm64"
+EMBEDDING_ONNX_QUANTIZATION = os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2")
+# Micro-batching of concurrent query embeddings
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32"))
+# Embedding cache: in-process LRU size and on-disk directory (empty disables the disk tier)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+# Most vectors kept in the disk tier (0 = unbounded); ~1.5 KB each for a 384-dimension model
+EMBEDDING_CACHE_DISK_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "500000"))
+# Semantic answer cache: cosine threshold, max entries and TTL
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# Chunks per embedding/upsert batch in the background ingestion pipeline
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+# PDF text extraction process pool (0 workers extracts in-process)
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_PAGE_TIMEOUT_SECONDS = float(os.getenv("PDF_PAGE_TIMEOUT_SECONDS", "30"))
+# Vector store backend: "qdrant" (remote) or "local" (in-process memory-mapped index)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "qdrant").lower()
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "./vector_store")
+LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "float32")
+LOCAL_VECTOR_IVF_LISTS = int(os.getenv("LOCAL_VECTOR_IVF_LISTS", "0"))
+LOCAL_VECTOR_IVF_PROBES = int(os.getenv("LOCAL_VECTOR_IVF_PROBES", "8"))
+# Qdrant collection storage: quantization ("none", "scalar" or "binary"), on-disk original
+# vectors and HNSW graph parameters, applied on collection creation and by `setup_database.py --migrate`
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+QDRANT_ON_DISK = os.getenv("QDRANT_ON_DISK", "false").lower() == "true"
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+# Search-time defaults (overridable per request): HNSW ef (0 = server default), and
+# rescoring/oversampling of quantized candidates against the original vectors
+QDRANT_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "0"))
+QDRANT_RESCORE = os.getenv("QDRANT_RESCORE", "true").lower() == "true"
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+# Hybrid retrieval: BM25 keyword index fused with dense search via reciprocal-rank fusion
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+KEYWORD_INDEX_DIR = os.getenv("KEYWORD_INDEX_DIR", "./keyword_index")
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Prompt assembly: estimated token budget for the system prompt, history and context, the part of
+# it kept for history, and the characters-per-token ratio used to estimate sizes
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3072"))
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "768"))
+PROMPT_CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", "4"))
+# Recent turns sent verbatim; older ones are folded, a batch at a time, into a rolling per-user summary
+PROMPT_HISTORY_TURNS = int(os.getenv("PROMPT_HISTORY_TURNS", "3"))
+HISTORY_SUMMARY = os.getenv("HISTORY_SUMMARY", "true").lower() == "true"
+SUMMARY_BATCH_TURNS = int(os.getenv("SUMMARY_BATCH_TURNS", "2"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "256"))
+# Write-behind buffer for conversation records: flushed with insert_many per batch or interval;
+# requests wait while MAX_PENDING records are queued (0 writes every record directly)
+CONVERSATION_FLUSH_BATCH_SIZE = int(os.getenv("CONVERSATION_FLUSH_BATCH_SIZE", "100"))
+CONVERSATION_FLUSH_INTERVAL_MS = float(os.getenv("CONVERSATION_FLUSH_INTERVAL_MS", "200"))
+CONVERSATION_BUFFER_MAX_PENDING = int(os.getenv("CONVERSATION_BUFFER_MAX_PENDING", "5000"))
+# Follow-up questions generated per chunk in the background at ingestion and stored in its payload;
+# /ask ranks the retrieved chunks' questions by similarity and only asks Ollama when none exist yet
+CHUNK_SUGGESTIONS = os.getenv("CHUNK_SUGGESTIONS", "true").lower() == "true"
+SUGGESTION_RANKING = os.getenv("SUGGESTION_RANKING", "true").lower() == "true"
+SUGGESTION_WORKERS = int(os.getenv("SUGGESTION_WORKERS", "1"))
+# Chunks waiting for suggestions; chunks beyond it are left for `setup_database.py --backfill-suggestions`
+SUGGESTION_QUEUE_SIZE = int(os.getenv("SUGGESTION_QUEUE_SIZE", "10000"))
+
+# LLM admission control: concurrent generations per Ollama server, requests admitted beyond the
+# servers' slots (further ones get 429) and how long a call waits for a slot (then 503)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "15"))
+# A server failing this many calls in a row is taken out of the pool for LLM_EJECT_SECONDS
+LLM_EJECT_AFTER_FAILURES = int(os.getenv("LLM_EJECT_AFTER_FAILURES", "3"))
+LLM_EJECT_SECONDS = float(os.getenv("LLM_EJECT_SECONDS", "30"))
+# /ask/batch: most questions per request and answers generated concurrently per batch
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "5000"))
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "8"))
+
+# Return the per-stage timing breakdown of /ask and /upload requests in a Server-Timing header
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "false").lower() == "true"
+# Seconds between retries of a failed startup step (MongoDB, Qdrant, model warm-up)
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
 
 # Create MongoDB client
 mongo_client = MongoClient(MONGODB_URI, server_api=ServerApi('1'))
 
+# Async MongoDB client used by the request handlers
+async_mongo_client = AsyncMongoClient(MONGODB_URI, server_api=ServerApi('1'))
+
 # Qdrant client
 qdrant_client = QdrantClient(
     url=qdrant_url,
     api_key=qdrant_api_key,
     timeout=30,  # optional: avoid hanging
+    check_compatibility=False,  # skip the version round trip at import
 )
 
+# Async Qdrant client used by the request handlers
+async_qdrant_client = AsyncQdrantClient(
+    url=qdrant_url,
+    api_key=qdrant_api_key,
+    timeout=30,
+    check_compatibility=False,  # skip the version round trip at import
+)
+
+
+# One client per Ollama server, in OLLAMA_BASE_URLS order
+ollama_llms = [
+    OllamaLLM(
+        model=ollama_model,
+        base_url=base_url,
+        temperature=0.7
+    )
+    for base_url in OLLAMA_BASE_URLS or [None]
+]
+
+# Same model constrained to JSON output, used by single-pass generation
+ollama_json_llms = [
+    OllamaLLM(
+        model=ollama_model,
+        base_url=base_url,
+        temperature=0.7,
+        format="json"
+    )
+    for base_url in OLLAMA_BASE_URLS or [None]
+]
 
-ollama_llm = OllamaLLM(
-    model=ollama_model,
-    base_url=ollama_base_url,
-    temperature=0.7
-)
\ No newline at end of file
+ollama_llm = ollama_llms[0]
+ollama_json_llm = ollama_json_llms[0]
@@ -1,23 +1,73 @@
-from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, BackgroundTasks, File, UploadFile, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 import os
-import uuid
+import json
+import asyncio
+import shutil
+import weakref
 import datetime
-from qdrant_client.http import models
+import tempfile
+from urllib.parse import quote
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import List, Optional
 
-from services.embeddings import embedding_model
-from services.ollama_service import ollama_response
-from utils.util_module import extract_text_from_pdf, chunk_text, generate_suggestions
-from models.pydantic_models import DocumentChunk, QuestionRequest, QuestionResponse, Reference
-from config import COLLECTION_NAME, mongo_client, qdrant_client
+from services.embeddings import aencode, aencode_query, embedding_metrics
+from services.ollama_service import aollama_response, aollama_stream
+from services.llm_gateway import llm_gateway
+from services.answer_cache import answer_cache, is_cacheable
+from services.vector_store import SearchFilter, vector_store
+from services.startup import initialize_services, is_ready, readiness
+from services.metrics import SUGGESTION_SOURCE, TimingMiddleware, metrics_response_body, stage
+from services.conversation_memory import cancel_summary_updates, clear_summaries, conversation_buffer, load_history
+from services.conversation_buffer import merge_pending
+from services.document_store import clear_originals, content_type_for, iter_original, open_original
+from services.prompt_builder import build_user_prompt
+from services.suggestions import rank_suggestions, suggestion_worker
+from services.keyword_index import keyword_index, reciprocal_rank_fusion
+from services.ingestion import (
+    ARCHIVE_EXTENSIONS, SUPPORTED_EXTENSIONS, create_bulk_job, create_job, expand_sources, hash_file, jobs,
+    remove_document, resolve_document, run_bulk_ingestion_job, run_ingestion_job
+)
+from utils.pdf_extraction import shutdown_pdf_executor
+from utils.pagination import encode_cursor, is_after_cursor, keyset_filter
+from utils.util_module import generate_suggestions, generate_reasoning, generate_structured_answer
+from models.pydantic_models import BatchQuestionRequest, QuestionRequest, QuestionResponse, Reference
+from config import (
+    SINGLE_PASS_GENERATION, HYBRID_SEARCH, RRF_K, SERVER_TIMING_HEADER, ASK_BATCH_MAX_QUESTIONS, ASK_BATCH_CONCURRENCY,
+    async_mongo_client
+)
 
 router = APIRouter()
 
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024
+# Fields returned by /documents; the original file is served by /documents/{id}/original
+DOCUMENT_LIST_PROJECTION = {
+    "_id": 0, "document_id": 1, "filename": 1, "upload_timestamp": 1, "chunk_count": 1, "original_size": 1
+}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connect, create indexes/collections and warm up the model in the background,
+    # so the worker answers /healthz right away and /readyz once everything is up
+    startup_task = asyncio.create_task(initialize_services())
+    yield
+    startup_task.cancel()
+    await conversation_buffer.close()
+    await cancel_summary_updates()
+    await suggestion_worker.close()
+    shutdown_pdf_executor()
+
+
 # Initialize clients
-app = FastAPI(title="Conversational RAG Q&A System")
+app = FastAPI(title="Conversational RAG Q&A System", lifespan=lifespan)
 
 os.environ['HF_HUB_DISABLE_SSL_VERIFICATION'] = '1'
 
@@ -30,65 +80,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage latency tracing for the question and upload endpoints
+app.add_middleware(
+    TimingMiddleware,
+    paths=["/ask", "/ask/stream", "/ask/batch", "/upload", "/upload/bulk"],
+    server_timing_header=SERVER_TIMING_HEADER,
+)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
-# Test MongoDB connection
-try:
-    mongo_client.admin.command('ping')
-    print("✅ Successfully connected to MongoDB!")
-except Exception as e:
-    print(f"❌ MongoDB connection failed: {e}")
-
-# Initialize database and collections
-db = mongo_client.rag_system
-documents_collection = db.documents
-conversations_collection = db.conversations
-
-# Create indexes for better performance
-try:
-    # Index for documents collection
-    documents_collection.create_index("document_id", unique=True)
-    documents_collection.create_index("filename")
-    documents_collection.create_index("upload_timestamp")
-    
-    # Index for conversations collection  
-    conversations_collection.create_index("user_id")
-    conversations_collection.create_index("timestamp")
-    conversations_collection.create_index([("user_id", 1), ("timestamp", -1)])
-    
-    print("✅ MongoDB indexes created successfully!")
-except Exception as e:
-    print(f"⚠️ Index creation warning: {e}")
-
-
-# Create Qdrant collection if not exists
-try:
-    # Check if collection exists
-    collections = qdrant_client.get_collections()
-    collection_names = [col.name for col in collections.collections]
-    
-    if COLLECTION_NAME not in collection_names:
-        qdrant_client.create_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=models.VectorParams(
-                size=384,  # all-MiniLM-L6-v2 embedding size
-                distance=models.Distance.COSINE
-            ),
-        )
-        print(f"✅ Qdrant collection '{COLLECTION_NAME}' created successfully!")
-    else:
-        print(f"✅ Qdrant collection '{COLLECTION_NAME}' already exists!")
-        
-    # Test connection by getting collection info
-    collection_info = qdrant_client.get_collection(COLLECTION_NAME)
-    print(f"✅ Qdrant connection successful! Collection has {collection_info.points_count} points.")
-    
-except Exception as e:
-    print(f"❌ Qdrant setup failed: {e}")
-    print("Please check your Qdrant URL and API key configuration.")
-
+# Async handles used on the request path
+async_db = async_mongo_client.rag_system
+async_documents_collection = async_db.documents
+async_conversations_collection = async_db.conversations
 
 
 # API Endpoints
@@ -96,165 +102,230 @@ except Exception as e:
 async def serve_index():
     return FileResponse("static/index.html")
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe: the worker is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness probe: MongoDB, the vector store and the warmed-up embedding model are available"""
+    ready = is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "starting",
+            "import_seconds": round(IMPORT_SECONDS, 3),
+            "checks": readiness,
+        }
+    )
+
 @app.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
-    """Upload and process PDF or TXT documents"""
+async def upload_document(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    """Accept a PDF or TXT document and process it in a background ingestion job"""
     if not file.filename.endswith(('.pdf', '.txt')):
         raise HTTPException(status_code=400, detail="Only PDF and TXT files are supported")
     
     try:
-        content = await file.read()
-        document_id = str(uuid.uuid4())
-        upload_time = datetime.datetime.utcnow()
+        # Spool the upload to disk so the job never holds the whole file in memory
+        suffix = os.path.splitext(file.filename)[1]
+        with stage("spool"), tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+            while data := await file.read(UPLOAD_READ_CHUNK_SIZE):
+                await run_in_threadpool(tmp.write, data)
         
-        # Extract text based on file type
-        if file.filename.endswith('.pdf'):
-            pages_text = extract_text_from_pdf(content)
-            all_text_chunks = []
-            
-            for text, page_num in pages_text:
-                chunks = chunk_text(text)
-                for chunk in chunks:
-                    chunk_id = str(uuid.uuid4())
-                    doc_chunk = DocumentChunk(
-                        document_id=document_id,
-                        filename=file.filename,
-                        chunk_id=chunk_id,
-                        chunk_text=chunk,
-                        page_number=page_num,
-                        upload_timestamp=upload_time
-                    )
-                    all_text_chunks.append(doc_chunk)
-        
-        else:  # TXT file
-            text = content.decode('utf-8')
-            chunks = chunk_text(text)
-            all_text_chunks = []
-            
-            for chunk in chunks:
-                chunk_id = str(uuid.uuid4())
-                doc_chunk = DocumentChunk(
-                    document_id=document_id,
-                    filename=file.filename,
-                    chunk_id=chunk_id,
-                    chunk_text=chunk,
-                    page_number=None,
-                    upload_timestamp=upload_time
-                )
-                all_text_chunks.append(doc_chunk)
-        
-        # Generate embeddings and store in Qdrant
-        texts = [chunk.chunk_text for chunk in all_text_chunks]
-       
-        embeddings = embedding_model.encode(texts)
-    
-
-        # Prepare points for Qdrant
-        points = []
-        for i, chunk in enumerate(all_text_chunks):
-            points.append(models.PointStruct(
-                id=chunk.chunk_id,
-                vector=embeddings[i].tolist(),
-                payload={
-                    "document_id": chunk.document_id,
-                    "filename": chunk.filename,
-                    "text": chunk.chunk_text,
-                    "page_number": chunk.page_number,
-                    "upload_timestamp": chunk.upload_timestamp.isoformat()
-                }
-            ))
-        
-        # Upload to Qdrant
-        qdrant_client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=points
-        )
-        
-        # Store metadata in MongoDB
-        document_metadata = {
-            "document_id": document_id,
-            "filename": file.filename,
-            "upload_timestamp": upload_time,
-            "chunk_count": len(all_text_chunks),
-            "original_content": content.decode('utf-8') if file.filename.endswith('.txt') else "PDF content"
-        }
-        
-        documents_collection.insert_one(document_metadata)
+        # Documents are identified by content, so the ID is known once the upload is hashed
+        content_hash = await run_in_threadpool(hash_file, tmp.name)
+        document_id, _ = await resolve_document(async_documents_collection, file.filename, content_hash)
+        job = create_job(file.filename, document_id)
+        background_tasks.add_task(run_ingestion_job, job, tmp.name, async_documents_collection, content_hash)
         
         return {
-            "message": "Document uploaded successfully",
-            "document_id": document_id,
+            "message": "Document accepted for processing",
+            "job_id": job.job_id,
+            "document_id": job.document_id,
             "filename": file.filename,
-            "chunks_created": len(all_text_chunks)
+            "status_url": f"/jobs/{job.job_id}"
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
 
 
-@app.post("/ask", response_model=QuestionResponse)
-async def ask_question(request: QuestionRequest):
-    """Ask a question and get RAG-based answer (Ollama version)"""
+@app.post("/upload/bulk")
+async def upload_documents_bulk(background_tasks: BackgroundTasks, files: List[UploadFile] = File(...)):
+    """Accept many PDF/TXT files or zip/tar archives of them and ingest them as one background job"""
+    workdir = tempfile.mkdtemp(prefix="rag_bulk_")
     try:
-        # 1. Get conversation history
-        history = list(conversations_collection.find(
-            {"user_id": request.user_id},
-            {"_id": 0, "question": 1, "answer": 1}
-        ).sort("timestamp", -1).limit(3))
-        
-        # 2. Generate query embedding
-        query_embedding = embedding_model.encode([request.question])
-
-        # 3. Search Qdrant for relevant chunks
-        search_results = qdrant_client.search(
-            collection_name=COLLECTION_NAME,
-            query_vector=query_embedding[0].tolist(),
-            limit=request.top_k
-        )
+        items = []
+        for upload in files:
+            if not upload.filename.endswith(SUPPORTED_EXTENSIONS + ARCHIVE_EXTENSIONS):
+                raise HTTPException(status_code=400, detail=f"Unsupported file type: {upload.filename}")
+            fd, path = tempfile.mkstemp(dir=workdir, suffix=os.path.splitext(upload.filename)[1])
+            with stage("spool"), os.fdopen(fd, "wb") as tmp:
+                while data := await upload.read(UPLOAD_READ_CHUNK_SIZE):
+                    await run_in_threadpool(tmp.write, data)
+            items.append((upload.filename, path))
         
-        # 4. Prepare context (take only top 2 references)
-        context_chunks, references = [], []
-        for result in search_results[:2]:   # ✅ only top 2
-            payload = result.payload
-            context_chunks.append(payload["text"])
-            references.append(Reference(
-                document=payload["filename"],
-                page=payload.get("page_number"),
-                chunk_id=str(result.id),
-                content_snippet=payload["text"][:400] + "..." if len(payload["text"]) > 400 else payload["text"]
-            ))
+        with stage("expand_sources"):
+            sources = await run_in_threadpool(expand_sources, items, workdir)
+        if not sources:
+            raise HTTPException(status_code=400, detail="No PDF or TXT files found in upload")
         
-        context_text = "\n\n".join(context_chunks)
-        history_text = "\n".join([f"Q: {h['question']}\nA: {h['answer']}" for h in reversed(history)])
+        job = create_bulk_job(len(sources))
+        background_tasks.add_task(run_bulk_ingestion_job, job, sources, async_documents_collection, workdir)
         
-        # 5. Build RAG prompt
-        system_prompt = """You are a helpful AI assistant that answers questions based on provided documents. 
+        return {
+            "message": "Documents accepted for processing",
+            "job_id": job.job_id,
+            "files_accepted": len(sources),
+            "status_url": f"/jobs/{job.job_id}"
+        }
+    
+    except HTTPException:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    except Exception as e:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=f"Error processing documents: {str(e)}")
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Report progress and throughput of an ingestion job"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+RAG_SYSTEM_PROMPT = """You are a helpful AI assistant that answers questions based on provided documents. 
         Use the document context to answer questions accurately. If you can't find the answer in the context, say so.
         Provide clear reasoning for your answers."""
-        
-        user_prompt = f"""Previous conversation:
-{history_text}
 
-Document context:
-{context_text}
 
-Current question: {request.question}
+# Keyword hits fetched per requested result when a filter will discard some of them
+FILTERED_KEYWORD_OVERFETCH = 4
 
-Please provide a detailed answer based on the document context. Explain your reasoning."""
-        
-        # 6. Get Ollama response
-        answer = ollama_response(system_prompt, user_prompt)
 
-        # 7. Generate reasoning separately
-        reasoning_prompt = f"""Based on this question: "{request.question}" and the answer: "{answer}", 
-        explain briefly how you arrived at this answer using the provided document context."""
-        reasoning = ollama_response(system_prompt="Provide brief reasoning for the given answer.", user_prompt=reasoning_prompt)
+async def fetch_missing_hits(hits: dict, chunk_ids: List[str]):
+    """Add payloads of the chunks not in `hits` yet, in one retrieve call"""
+    missing = list(dict.fromkeys(chunk_id for chunk_id in chunk_ids if chunk_id not in hits))
+    if missing:
+        with stage("fetch_payloads"):
+            for hit in await vector_store.retrieve(missing):
+                hits[hit.id] = hit
 
-        # 8. Generate suggestions
-        suggestions = generate_suggestions(request.question, context_text)
-        
-        # 9. Save conversation in Mongo
-        conversations_collection.insert_one({
+
+async def fuse_keyword_hits(questions: List[str], dense_results: List[list], limit: int,
+                            search_filter: Optional[SearchFilter] = None):
+    """
+    Fuse BM25 keyword hits into each question's dense results via reciprocal-rank
+    fusion; payloads of keyword-only hits are fetched at once for all questions
+    """
+    if not HYBRID_SEARCH:
+        return dense_results
+
+    with stage("keyword_search"):
+        keyword_limit = limit * FILTERED_KEYWORD_OVERFETCH if search_filter is not None else limit
+        keyword_ids = [
+            [chunk_id for chunk_id, _ in keyword_index.search(question, keyword_limit)] for question in questions
+        ]
+
+    hits = {hit.id: hit for results in dense_results for hit in results}
+    if search_filter is not None:
+        # The keyword index has no payloads, so drop hits outside the filter before fusing
+        await fetch_missing_hits(hits, [chunk_id for ids in keyword_ids for chunk_id in ids])
+        keyword_ids = [
+            [chunk_id for chunk_id in ids if chunk_id in hits and search_filter.matches(hits[chunk_id].payload)][:limit]
+            for ids in keyword_ids
+        ]
+
+    fused = [
+        reciprocal_rank_fusion([[hit.id for hit in results], ids], k=RRF_K)[:limit] if ids else None
+        for results, ids in zip(dense_results, keyword_ids)
+    ]
+    await fetch_missing_hits(hits, [chunk_id for ranking in fused if ranking for chunk_id, _ in ranking])
+
+    # Copies, since questions of a batch can share hits but not their fused scores
+    return [
+        results if ranking is None else
+        [replace(hits[chunk_id], score=score) for chunk_id, score in ranking if chunk_id in hits]
+        for results, ranking in zip(dense_results, fused)
+    ]
+
+
+async def hybrid_search(question: str, query_embedding, limit: int,
+                        hnsw_ef: Optional[int] = None, oversampling: Optional[float] = None,
+                        search_filter: Optional[SearchFilter] = None):
+    """Dense vector search, fused with BM25 keyword hits via reciprocal-rank fusion when enabled"""
+    with stage("vector_search"):
+        dense_results = await vector_store.search(
+            query_embedding.tolist(), limit=limit, hnsw_ef=hnsw_ef, oversampling=oversampling,
+            search_filter=search_filter
+        )
+    return (await fuse_keyword_hits([question], [dense_results], limit, search_filter))[0]
+
+
+def search_filter_for(request) -> Optional[SearchFilter]:
+    """Restrict retrieval to the request's document_ids/filename, if any"""
+    if request.document_ids or request.filename:
+        return SearchFilter(document_ids=request.document_ids or None, filename=request.filename)
+    return None
+
+
+def build_rag_prompt(question: str, search_results: list, history, summary):
+    """Context, references and the RAG prompt for a question's retrieved chunks"""
+    context_chunks, references = [], []
+    for result in search_results[:2]:   # ✅ only top 2
+        payload = result.payload
+        context_chunks.append(payload["text"])
+        references.append(Reference(
+            document=payload["filename"],
+            page=payload.get("page_number"),
+            chunk_id=str(result.id),
+            content_snippet=payload["text"][:400] + "..." if len(payload["text"]) > 400 else payload["text"]
+        ))
+
+    # Build RAG prompt within the token budget
+    user_prompt, context_text = build_user_prompt(
+        RAG_SYSTEM_PROMPT, question, context_chunks, history, summary
+    )
+    return user_prompt, context_text, references
+
+
+async def prepare_rag_context(request: QuestionRequest):
+    """
+    Fetch history, retrieve relevant chunks and build the RAG prompt for a question.
+    Also reports whether the answer may go through the shared answer cache.
+    """
+    # 1. Get the rolling summary and the recent turns it doesn't cover
+    with stage("history"):
+        summary, history = await load_history(request.user_id)
+    
+    # 2. Generate query embedding
+    with stage("embedding"):
+        query_embedding = await aencode_query(request.question)
+
+    # 3. Search Qdrant for relevant chunks, within the requested documents if any
+    search_results = await hybrid_search(
+        request.question, query_embedding, request.top_k,
+        hnsw_ef=request.hnsw_ef, oversampling=request.oversampling, search_filter=search_filter_for(request)
+    )
+    
+    # 4-5. Prepare context (top 2 references) and build the RAG prompt
+    user_prompt, context_text, references = build_rag_prompt(request.question, search_results, history, summary)
+
+    # 6. Follow-up questions precomputed for the retrieved chunks (empty until generated)
+    with stage("suggestions"):
+        suggestions = await rank_suggestions(request.question, query_embedding, search_results)
+
+    return user_prompt, context_text, references, query_embedding, suggestions, is_cacheable(summary, history)
+
+
+async def save_conversation(request: QuestionRequest, answer: str, reasoning: str, references: List[Reference]):
+    """Queue a question/answer turn for the write-behind buffer (waits only when it is full)"""
+    with stage("save_conversation"):
+        await conversation_buffer.add({
             "user_id": request.user_id,
             "question": request.question,
             "answer": answer,
@@ -262,64 +333,389 @@ Please provide a detailed answer based on the document context. Explain your rea
             "timestamp": datetime.datetime.utcnow(),
             "references": [ref.dict() for ref in references]
         })
+
+
+async def generate_answer(question: str, user_prompt: str, context_text: str, suggestions: List[str]):
+    """Answer, reasoning and (unless precomputed) suggestions from Ollama"""
+    SUGGESTION_SOURCE.labels("precomputed" if suggestions else "llm").inc()
+    if SINGLE_PASS_GENERATION:
+        answer, reasoning, generated = await generate_structured_answer(
+            RAG_SYSTEM_PROMPT, user_prompt, with_suggestions=not suggestions
+        )
+        return answer, reasoning, suggestions or generated
+
+    async def answer_with_reasoning():
+        answer = await aollama_response(RAG_SYSTEM_PROMPT, user_prompt, call="answer")
+        reasoning = await generate_reasoning(question, answer)
+        return answer, reasoning
+
+    if suggestions:
+        answer, reasoning = await answer_with_reasoning()
+        return answer, reasoning, suggestions
+    # Suggestions only depend on the question and context, so generate them alongside the answer
+    (answer, reasoning), suggestions = await asyncio.gather(
+        answer_with_reasoning(),
+        generate_suggestions(question, context_text)
+    )
+    return answer, reasoning, suggestions
+
+
+def sse_event(event: str, data) -> str:
+    """Format a Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/ask", response_model=QuestionResponse)
+async def ask_question(request: QuestionRequest):
+    """Ask a question and get RAG-based answer (Ollama version)"""
+    # Turn the request away before retrieval when the LLM is saturated
+    admission = llm_gateway.admit()
+    try:
+        # 1-6. Retrieve context, build prompt and rank precomputed suggestions
+        cache_generation = answer_cache.generation
+        user_prompt, context_text, references, query_embedding, suggestions, cacheable = await prepare_rag_context(request)
+        chunk_ids = [ref.chunk_id for ref in references]
+
+        # Reuse a cached answer for a near-identical question over the same chunks (not for follow-ups,
+        # whose answers depend on this user's conversation)
+        cached = answer_cache.lookup(query_embedding, chunk_ids) if cacheable else None
+        if cached is not None:
+            await save_conversation(request, cached.answer, cached.reasoning, cached.references)
+            return cached
+        
+        # 7-8. Get answer, reasoning and (unless precomputed) suggestions from Ollama
+        answer, reasoning, suggestions = await generate_answer(request.question, user_prompt, context_text, suggestions)
+        
+        # 9. Save conversation in Mongo
+        await save_conversation(request, answer, reasoning, references)
         
         # 10. Return response
-        return QuestionResponse(
+        response = QuestionResponse(
             answer=answer,
             reasoning=reasoning,
             references=references,
             suggestions=suggestions
         )
+        if cacheable:
+            answer_cache.store(query_embedding, chunk_ids, response, cache_generation)
+        return response
     
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
+    finally:
+        admission.release()
+
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """Ask a question and stream the answer as Server-Sent Events.
+
+    Emits `token` events while the answer is generated, followed by
+    `references`, `reasoning`, `suggestions` and a final `done` event.
+    """
+    # Once streaming starts the status is 200, so admission happens here; the stream releases it
+    admission = llm_gateway.admit()
+    try:
+        cache_generation = answer_cache.generation
+        user_prompt, context_text, references, query_embedding, suggestions, cacheable = await prepare_rag_context(request)
     except Exception as e:
+        admission.release()
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
+    chunk_ids = [ref.chunk_id for ref in references]
+    cached = answer_cache.lookup(query_embedding, chunk_ids) if cacheable else None
+    if cached is not None:
+        admission.release()
+
+    async def cached_event_stream():
+        try:
+            yield sse_event("token", {"text": cached.answer})
+            yield sse_event("references", [ref.dict() for ref in cached.references])
+            yield sse_event("reasoning", {"text": cached.reasoning})
+            yield sse_event("suggestions", cached.suggestions)
+            await save_conversation(request, cached.answer, cached.reasoning, cached.references)
+            yield sse_event("done", {})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error processing question: {str(e)}"})
+
+    async def event_stream():
+        # Without precomputed suggestions, generate them right away; they don't depend on the answer
+        SUGGESTION_SOURCE.labels("precomputed" if suggestions else "llm").inc()
+        suggestions_task = None
+        if not suggestions:
+            suggestions_task = asyncio.create_task(generate_suggestions(request.question, context_text))
+        try:
+            answer_parts = []
+            async for token in aollama_stream(RAG_SYSTEM_PROMPT, user_prompt, call="answer"):
+                answer_parts.append(token)
+                yield sse_event("token", {"text": token})
+            answer = "".join(answer_parts)
+
+            yield sse_event("references", [ref.dict() for ref in references])
+
+            reasoning = await generate_reasoning(request.question, answer)
+            yield sse_event("reasoning", {"text": reasoning})
+
+            final_suggestions = suggestions if suggestions_task is None else await suggestions_task
+            yield sse_event("suggestions", final_suggestions)
+
+            await save_conversation(request, answer, reasoning, references)
+            if cacheable:
+                answer_cache.store(query_embedding, chunk_ids, QuestionResponse(
+                    answer=answer,
+                    reasoning=reasoning,
+                    references=references,
+                    suggestions=final_suggestions
+                ), cache_generation)
+            yield sse_event("done", {})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error processing question: {str(e)}"})
+        finally:
+            if suggestions_task is not None:
+                suggestions_task.cancel()
+            admission.release()
+
+    stream = cached_event_stream() if cached is not None else event_stream()
+    # Also release when the stream is dropped without ever being started (client gone before the body)
+    weakref.finalize(stream, admission.release)
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/ask/batch")
+async def ask_question_batch(request: BatchQuestionRequest):
+    """Ask many questions and stream the results as NDJSON, one line per question as it completes.
+
+    All questions are encoded in one call and retrieved with one vector-store
+    batch search; then up to ASK_BATCH_CONCURRENCY answers are generated at a
+    time, at background priority so interactive requests go first. Each line
+    holds the question's `index` and `question` with the /ask response fields,
+    or an `error`.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="No questions given")
+    if len(request.questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {ASK_BATCH_MAX_QUESTIONS} questions per batch")
+
+    # One admission for the whole batch; the stream releases it
+    admission = llm_gateway.admit()
+    try:
+        cache_generation = answer_cache.generation
+        with stage("history"):
+            summary, history = await load_history(request.user_id)
+        cacheable = is_cacheable(summary, history)
+        with stage("embedding"):
+            query_embeddings = await aencode(request.questions)
+        search_filter = search_filter_for(request)
+        with stage("vector_search"):
+            dense_results = await vector_store.search_batch(
+                query_embeddings.tolist(), limit=request.top_k, hnsw_ef=request.hnsw_ef,
+                oversampling=request.oversampling, search_filter=search_filter
+            )
+        search_results = await fuse_keyword_hits(request.questions, dense_results, request.top_k, search_filter)
+    except Exception as e:
+        admission.release()
+        raise HTTPException(status_code=500, detail=f"Error processing questions: {str(e)}")
+
+    semaphore = asyncio.Semaphore(ASK_BATCH_CONCURRENCY)
+
+    async def answer_question(index: int) -> dict:
+        question, results, query_embedding = request.questions[index], search_results[index], query_embeddings[index]
+        async with semaphore:
+            try:
+                user_prompt, context_text, references = build_rag_prompt(question, results, history, summary)
+                chunk_ids = [ref.chunk_id for ref in references]
+                response = answer_cache.lookup(query_embedding, chunk_ids) if cacheable else None
+                if response is None:
+                    with stage("suggestions"):
+                        suggestions = await rank_suggestions(question, query_embedding, results)
+                    with llm_gateway.background_priority():
+                        answer, reasoning, suggestions = await generate_answer(
+                            question, user_prompt, context_text, suggestions
+                        )
+                    response = QuestionResponse(
+                        answer=answer,
+                        reasoning=reasoning,
+                        references=references,
+                        suggestions=suggestions
+                    )
+                    if cacheable:
+                        answer_cache.store(query_embedding, chunk_ids, response, cache_generation)
+                if request.save_history:
+                    await save_conversation(
+                        QuestionRequest(user_id=request.user_id, question=question),
+                        response.answer, response.reasoning, response.references
+                    )
+                return {"index": index, "question": question, **response.dict()}
+            except Exception as e:
+                return {"index": index, "question": question, "error": f"Error processing question: {str(e)}"}
+
+    async def result_stream():
+        tasks = [asyncio.create_task(answer_question(i)) for i in range(len(request.questions))]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield json.dumps(await next_result) + "\n"
+        finally:
+            # Client gone: stop generating for the questions still pending
+            for task in tasks:
+                task.cancel()
+            admission.release()
+
+    stream = result_stream()
+    weakref.finalize(stream, admission.release)
+    return StreamingResponse(
+        stream,
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: per-stage latency histograms, LLM token counts and ingestion counters"""
+    body, content_type = metrics_response_body()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/embeddings/metrics")
+async def get_embedding_metrics():
+    """Batching scheduler queue depth and embedding cache hit/miss counters"""
+    return embedding_metrics()
+
+@app.get("/llm/metrics")
+async def get_llm_metrics():
+    """Slots in use per Ollama server, ejected servers and calls waiting for a slot"""
+    return llm_gateway.metrics()
+
+@app.get("/cache/metrics")
+async def get_answer_cache_metrics():
+    """Hit/miss counters of the semantic answer cache"""
+    return answer_cache.metrics()
+
 @app.get("/history")
-async def get_history(user_id: str):
-    """Get user's conversation history"""
+async def get_history(user_id: str, limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None):
+    """Get a page of the user's conversation history, newest first; pass `next_cursor` back as `cursor`"""
     try:
-        history = list(conversations_collection.find(
-            {"user_id": user_id},
-            {"_id": 0}
-        ).sort("timestamp", -1))
-        
-        return {"history": history}
+        query = {"user_id": user_id}
+        # Snapshot buffered turns first so a flush during the query can't hide them
+        pending = conversation_buffer.pending_for(user_id)
+        if cursor:
+            query.update(keyset_filter("timestamp", "_id", cursor))
+            pending = [record for record in pending if is_after_cursor(record, "timestamp", "_id", cursor)]
+
+        history = await async_conversations_collection.find(query).sort(
+            [("timestamp", -1), ("_id", -1)]
+        ).limit(limit + 1).to_list()
+        history = merge_pending(history, pending, limit + 1)
+
+        next_cursor = None
+        if len(history) > limit:
+            history = history[:limit]
+            next_cursor = encode_cursor(history[-1]["timestamp"], history[-1]["_id"])
+        for turn in history:
+            turn.pop("_id", None)
+        return {"history": history, "next_cursor": next_cursor}
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving history: {str(e)}")
 
 @app.get("/documents")
-async def list_documents():
-    """List all uploaded documents"""
+async def list_documents(limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
+    """List uploaded documents, newest first; pass `next_cursor` back as `cursor`"""
     try:
-        documents = list(documents_collection.find({}, {"_id": 0}))
-        return {"documents": documents}
+        query = keyset_filter("upload_timestamp", "document_id", cursor) if cursor else {}
+        documents = await async_documents_collection.find(query, DOCUMENT_LIST_PROJECTION).sort(
+            [("upload_timestamp", -1), ("document_id", -1)]
+        ).limit(limit + 1).to_list()
+
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = encode_cursor(documents[-1]["upload_timestamp"], documents[-1]["document_id"])
+        return {"documents": documents, "next_cursor": next_cursor}
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving documents: {str(e)}")
 
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str):
+    """Delete one document: its chunks, keyword index entries, stored original and metadata"""
+    try:
+        chunks_deleted = await remove_document(document_id, async_documents_collection)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
+    if chunks_deleted is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"message": "Document deleted successfully", "document_id": document_id, "chunks_deleted": chunks_deleted}
+
+@app.get("/documents/{document_id}/original")
+async def get_document_original(document_id: str, request: Request):
+    """Download the original uploaded file, streamed from GridFS"""
+    try:
+        metadata = await async_documents_collection.find_one(
+            {"document_id": document_id},
+            {"_id": 0, "filename": 1, "original_file_id": 1, "original_encoding": 1, "original_content": 1}
+        )
+        grid_out = await open_original(metadata["original_file_id"]) if metadata and metadata.get("original_file_id") else None
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving document: {str(e)}")
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    filename = metadata["filename"]
+    media_type = content_type_for(filename)
+    headers = {"Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}"}
+    if grid_out is None:
+        # Text uploaded before originals moved to GridFS is still inline
+        if metadata.get("original_content") is not None and not filename.endswith(".pdf"):
+            return Response(content=metadata["original_content"], media_type=media_type, headers=headers)
+        raise HTTPException(status_code=404, detail="Original file not stored")
+
+    # Hand gzip-stored files to clients that accept gzip without decompressing them
+    gzipped = metadata.get("original_encoding") == "gzip"
+    passthrough = gzipped and "gzip" in request.headers.get("accept-encoding", "")
+    headers["Vary"] = "Accept-Encoding"
+    if passthrough:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        iter_original(grid_out, decompress=gzipped and not passthrough),
+        media_type=media_type,
+        headers=headers
+    )
+
 @app.delete("/clear")
 async def clear_system():
     """Clear all documents and conversations"""
     try:
         # Clear MongoDB collections
-        documents_collection.delete_many({})
-        conversations_collection.delete_many({})
-        
-        # Clear Qdrant collection
-        qdrant_client.delete_collection(COLLECTION_NAME)
+        await async_documents_collection.delete_many({})
+        await conversation_buffer.discard()
+        # An update still in flight would write a summary back after it is cleared
+        await cancel_summary_updates()
+        await async_conversations_collection.delete_many({})
+        await clear_summaries()
+        await clear_originals()
+        suggestion_worker.discard()
         
-        # Recreate collection
-        qdrant_client.create_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE),
-        )
+        # Clear and recreate the vector collection and keyword index
+        await vector_store.recreate()
+        await keyword_index.clear()
+        answer_cache.invalidate()
         
         return {"message": "System cleared successfully"}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clearing system: {str(e)}")
 
+IMPORT_SECONDS = time.perf_counter() - _import_started
+print(f"⏱️ main imported in {IMPORT_SECONDS:.2f}s")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -7,6 +7,23 @@ class QuestionRequest(BaseModel):
     user_id: str
     question: str
     top_k: Optional[int] = 4
+    # Optional Qdrant search tuning (HNSW beam width, quantized-candidate oversampling)
+    hnsw_ef: Optional[int] = None
+    oversampling: Optional[float] = None
+    # Optional retrieval filter: only search chunks of these documents and/or this file
+    document_ids: Optional[List[str]] = None
+    filename: Optional[str] = None
+
+class BatchQuestionRequest(BaseModel):
+    user_id: str
+    questions: List[str]
+    top_k: Optional[int] = 4
+    hnsw_ef: Optional[int] = None
+    oversampling: Optional[float] = None
+    document_ids: Optional[List[str]] = None
+    filename: Optional[str] = None
+    # Store each answered question in the user's history like /ask does; off for evaluation runs
+    save_history: bool = False
 
 class Reference(BaseModel):
     document: str
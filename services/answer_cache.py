@@ -0,0 +1,112 @@
+# answer_cache.py
+import time
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+
+from models.pydantic_models import QuestionResponse
+from config import ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_SECONDS
+
+
+@dataclass
+class CachedAnswer:
+    embedding: np.ndarray
+    chunk_ids: Tuple[str, ...]
+    response: QuestionResponse
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers looked up by question similarity.
+    A cached answer is reused when the new question's embedding is within
+    `threshold` cosine similarity and retrieval returned the same chunks.
+    Entries are evicted by LRU and TTL, and dropped wholesale whenever the
+    document collection changes. The cache is shared by all users, so only
+    answers whose prompt carried no conversation may use it (`is_cacheable`).
+    """
+
+    def __init__(self, threshold: float = 0.95, max_size: int = 1000, ttl_seconds: float = 3600):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._ids = itertools.count()
+        # Bumped on every invalidation so in-flight answers built on the old corpus are not stored
+        self.generation = 0
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        # Entries are kept in recency order, but TTL is by creation time, so scan them all
+        for key in [k for k, entry in self._entries.items() if entry.created_at < cutoff]:
+            del self._entries[key]
+
+    def lookup(self, embedding, chunk_ids: List[str]) -> Optional[QuestionResponse]:
+        self._expire()
+        chunk_ids = tuple(chunk_ids)
+        candidates = [(key, entry) for key, entry in self._entries.items() if entry.chunk_ids == chunk_ids]
+        if candidates:
+            query = self._normalize(embedding)
+            similarities = np.stack([entry.embedding for _, entry in candidates]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                key, entry = candidates[best]
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.response.copy(deep=True)
+
+        self.misses += 1
+        return None
+
+    def store(self, embedding, chunk_ids: List[str], response: QuestionResponse, generation: int):
+        if generation != self.generation:
+            return
+        self._entries[next(self._ids)] = CachedAnswer(
+            embedding=self._normalize(embedding),
+            chunk_ids=tuple(chunk_ids),
+            response=response.copy(deep=True),
+            created_at=time.monotonic()
+        )
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop all entries; called whenever documents are added or removed"""
+        self._entries.clear()
+        self.generation += 1
+        self.invalidations += 1
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def is_cacheable(summary: Optional[str], history: List[dict]) -> bool:
+    """An answer depends only on the question and chunks when the prompt had no summary or history"""
+    return not summary and not history
+
+
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    max_size=ANSWER_CACHE_SIZE,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,153 @@
+# conversation_buffer.py
+import time
+import asyncio
+import datetime
+from typing import Callable, List, Optional
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from services.metrics import CONVERSATION_BUFFER_PENDING, CONVERSATION_RECORDS, detach_trace, observe_stage
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class ConversationWriteBuffer:
+    """
+    Write-behind buffer for conversation records.
+    Records are queued in memory and written with one insert_many per
+    `batch_size` records, at the latest `flush_interval_ms` after the previous
+    flush. add() waits while `max_pending` records are queued (0 writes each
+    record directly). Queued records stay visible through pending_for() until
+    MongoDB acknowledges them, so readers can merge them into query results.
+    """
+
+    def __init__(self, collection, batch_size: int = 100, flush_interval_ms: float = 200.0,
+                 max_pending: int = 5000, on_flushed: Optional[Callable[[List[dict]], None]] = None):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_pending = max_pending
+        self.on_flushed = on_flushed
+        self._pending: List[dict] = []
+        self._has_records = asyncio.Event()
+        self._batch_ready = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._worker: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def _ensure_worker(self):
+        if not self._closing and (self._worker is None or self._worker.done()):
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def add(self, record: dict) -> dict:
+        """Queue a record for writing, waiting while the buffer is full"""
+        record.setdefault("_id", ObjectId())  # client-side id lets readers de-duplicate
+        timestamp = record.get("timestamp")
+        if isinstance(timestamp, datetime.datetime):
+            # MongoDB keeps milliseconds; match it so buffered and stored copies sort and page alike
+            record["timestamp"] = timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+        if self.max_pending <= 0:
+            await self.collection.insert_one(record)
+            self._written([record])
+            return record
+
+        async with self._space:
+            await self._space.wait_for(lambda: len(self._pending) < self.max_pending)
+            self._pending.append(record)
+        CONVERSATION_BUFFER_PENDING.set(len(self._pending))
+        self._ensure_worker()
+        self._has_records.set()
+        if len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+        return record
+
+    def pending_for(self, user_id: str) -> List[dict]:
+        """Records of a user not yet acknowledged by MongoDB"""
+        return [record for record in self._pending if record["user_id"] == user_id]
+
+    async def _run(self):
+        detach_trace()
+        while not self._closing:
+            await self._has_records.wait()
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Failed to write {len(self._pending)} conversation records, retrying: {str(e)}")
+                if not self._closing:
+                    await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        """Write everything queued so far, one insert_many per batch"""
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                started = time.perf_counter()
+                try:
+                    await self.collection.insert_many(batch, ordered=False)
+                    failed = set()
+                except BulkWriteError as e:
+                    # Records already written by an earlier, partly failed attempt count as written
+                    failed = {error["index"] for error in e.details.get("writeErrors", [])
+                              if error.get("code") != DUPLICATE_KEY_ERROR}
+                    if len(failed) == len(batch):
+                        raise
+                observe_stage("conversation_flush", time.perf_counter() - started, endpoint="background")
+                self._written([record for i, record in enumerate(batch) if i not in failed])
+                if failed:
+                    raise RuntimeError(f"{len(failed)} of {len(batch)} records were rejected")
+            self._has_records.clear()
+            self._batch_ready.clear()
+
+    def _written(self, records: List[dict]):
+        written_ids = {record["_id"] for record in records}
+        self._pending = [record for record in self._pending if record["_id"] not in written_ids]
+        CONVERSATION_BUFFER_PENDING.set(len(self._pending))
+        CONVERSATION_RECORDS.inc(len(records))
+        asyncio.get_running_loop().create_task(self._notify_space())
+        if self.on_flushed is not None and records:
+            self.on_flushed(records)
+
+    async def _notify_space(self):
+        async with self._space:
+            self._space.notify_all()
+
+    async def discard(self):
+        """Drop queued records, e.g. when all conversations are deleted"""
+        async with self._flush_lock:
+            self._pending = []
+            self._has_records.clear()
+            self._batch_ready.clear()
+        CONVERSATION_BUFFER_PENDING.set(0)
+        await self._notify_space()
+
+    async def close(self):
+        """Stop the background writer and flush what is left"""
+        # Wake the writer and let it exit rather than cancelling it mid-insert
+        self._closing = True
+        self._has_records.set()
+        self._batch_ready.set()
+        if self._worker is not None:
+            await self._worker
+            self._worker = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"❌ Lost {len(self._pending)} conversation records on shutdown: {str(e)}")
+        finally:
+            self._closing = False
+
+
+def merge_pending(docs: List[dict], pending: List[dict], limit: Optional[int] = None) -> List[dict]:
+    """
+    Union of query results and buffered records, newest first by (timestamp, _id).
+    Take the `pending` snapshot before running the query: a record flushed in
+    between then shows up in both and is de-duplicated here.
+    """
+    seen = {doc["_id"] for doc in docs}
+    merged = docs + [dict(record) for record in pending if record["_id"] not in seen]
+    merged.sort(key=lambda doc: (doc["timestamp"], doc["_id"]), reverse=True)
+    return merged[:limit] if limit else merged
@@ -0,0 +1,143 @@
+# conversation_memory.py
+import asyncio
+import datetime
+from typing import Dict, List, Optional, Tuple
+from services.metrics import detach_trace
+from services.conversation_buffer import ConversationWriteBuffer, merge_pending
+from services.ollama_service import aollama_response
+from services.prompt_builder import truncate_to_tokens
+from config import (
+    HISTORY_SUMMARY, PROMPT_HISTORY_TURNS, SUMMARY_BATCH_TURNS, SUMMARY_MAX_TOKENS, CONVERSATION_FLUSH_BATCH_SIZE,
+    CONVERSATION_FLUSH_INTERVAL_MS, CONVERSATION_BUFFER_MAX_PENDING, async_mongo_client
+)
+
+conversations_collection = async_mongo_client.rag_system.conversations
+summaries_collection = async_mongo_client.rag_system.conversation_summaries
+
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a conversation between a user and a document Q&A assistant.
+Keep the topics, facts, names and numbers a follow-up question might refer to. Reply with the updated summary only."""
+
+# user_id -> running summary update
+_summary_tasks: Dict[str, asyncio.Task] = {}
+
+
+def _turns_cursor(user_id: str, after: Optional[datetime.datetime] = None, newest_first: bool = True):
+    """Turns of a user (optionally only those after a timestamp) ordered by time"""
+    query = {"user_id": user_id}
+    if after is not None:
+        query["timestamp"] = {"$gt": after}
+    return conversations_collection.find(
+        query, {"_id": 1, "question": 1, "answer": 1, "timestamp": 1}
+    ).sort("timestamp", -1 if newest_first else 1)
+
+
+async def load_history(user_id: str) -> Tuple[Optional[str], List[dict]]:
+    """
+    The user's rolling summary and the most recent turns it does not cover
+    yet, newest first, including turns still in the write buffer. Both are
+    fetched concurrently.
+    """
+    pending = conversation_buffer.pending_for(user_id)
+    turns_query = _turns_cursor(user_id).limit(PROMPT_HISTORY_TURNS).to_list()
+    if not HISTORY_SUMMARY:
+        return None, merge_pending(await turns_query, pending, PROMPT_HISTORY_TURNS)
+
+    summary_doc, turns = await asyncio.gather(
+        summaries_collection.find_one({"user_id": user_id}, {"_id": 0, "summary": 1, "covered_until": 1}),
+        turns_query
+    )
+    turns = merge_pending(turns, pending, PROMPT_HISTORY_TURNS)
+    if not summary_doc:
+        return None, turns
+    covered_until = summary_doc["covered_until"]
+    return summary_doc.get("summary"), [turn for turn in turns if turn["timestamp"] > covered_until]
+
+
+async def summarize_turns(previous_summary: Optional[str], turns: List[dict]) -> str:
+    """Fold a batch of turns into the running summary with Ollama"""
+    turns_text = "\n\n".join(
+        truncate_to_tokens(f"Q: {turn['question']}\nA: {turn['answer']}", SUMMARY_MAX_TOKENS) for turn in turns
+    )
+    user_prompt = f"""Current summary:
+{previous_summary or "(none yet)"}
+
+New conversation turns:
+{turns_text}
+
+Write the updated summary in at most {int(SUMMARY_MAX_TOKENS * 0.75)} words."""
+    summary = await aollama_response(SUMMARY_SYSTEM_PROMPT, user_prompt, call="summary", background=True)
+    return truncate_to_tokens(summary.strip(), SUMMARY_MAX_TOKENS)
+
+
+async def update_summary(user_id: str):
+    """Fold turns older than the verbatim window into the summary, SUMMARY_BATCH_TURNS at a time"""
+    detach_trace()
+    while True:
+        summary_doc = await summaries_collection.find_one({"user_id": user_id}) or {}
+        covered_until = summary_doc.get("covered_until")
+        query = {"user_id": user_id}
+        if covered_until is not None:
+            query["timestamp"] = {"$gt": covered_until}
+        foldable = await conversations_collection.count_documents(query) - PROMPT_HISTORY_TURNS
+        if foldable < SUMMARY_BATCH_TURNS:
+            return
+
+        turns = await _turns_cursor(user_id, covered_until, newest_first=False).limit(
+            SUMMARY_BATCH_TURNS
+        ).to_list()
+        summary = await summarize_turns(summary_doc.get("summary"), turns)
+        await summaries_collection.update_one(
+            {"user_id": user_id},
+            {"$set": {
+                "summary": summary,
+                "covered_until": turns[-1]["timestamp"],
+                "summarized_turns": summary_doc.get("summarized_turns", 0) + len(turns),
+                "updated_at": datetime.datetime.utcnow()
+            }},
+            upsert=True
+        )
+
+
+async def _run_summary_update(user_id: str):
+    try:
+        await update_summary(user_id)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"⚠️ Failed to update conversation summary for user {user_id}: {str(e)}")
+    finally:
+        _summary_tasks.pop(user_id, None)
+
+
+def schedule_summary_update(user_id: str):
+    """Update the user's summary in the background; one update per user runs at a time"""
+    if not HISTORY_SUMMARY or user_id in _summary_tasks:
+        return
+    _summary_tasks[user_id] = asyncio.create_task(_run_summary_update(user_id))
+
+
+def _schedule_summary_updates(records: List[dict]):
+    # Summaries only see written turns, so check them once a batch reaches MongoDB
+    for user_id in {record["user_id"] for record in records}:
+        schedule_summary_update(user_id)
+
+
+conversation_buffer = ConversationWriteBuffer(
+    conversations_collection,
+    batch_size=CONVERSATION_FLUSH_BATCH_SIZE,
+    flush_interval_ms=CONVERSATION_FLUSH_INTERVAL_MS,
+    max_pending=CONVERSATION_BUFFER_MAX_PENDING,
+    on_flushed=_schedule_summary_updates
+)
+
+
+async def cancel_summary_updates():
+    """Stop pending summary updates (on shutdown or before a clear); they resume with the user's next question"""
+    tasks = list(_summary_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def clear_summaries():
+    await summaries_collection.delete_many({})
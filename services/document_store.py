@@ -0,0 +1,96 @@
+# document_store.py
+import zlib
+from typing import AsyncIterator, Optional
+from bson import ObjectId
+from gridfs import AsyncGridFSBucket
+from gridfs.errors import NoFile
+from starlette.concurrency import run_in_threadpool
+from config import async_mongo_client
+
+ORIGINALS_BUCKET = "originals"
+READ_CHUNK_SIZE = 1024 * 1024
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+# Already-compressed formats are stored as-is
+UNCOMPRESSED_EXTENSIONS = (".pdf",)
+
+_bucket: Optional[AsyncGridFSBucket] = None
+
+
+def originals_bucket() -> AsyncGridFSBucket:
+    """GridFS bucket holding the original uploaded files, created on first use"""
+    global _bucket
+    if _bucket is None:
+        _bucket = AsyncGridFSBucket(async_mongo_client.rag_system, bucket_name=ORIGINALS_BUCKET)
+    return _bucket
+
+
+def content_type_for(filename: str) -> str:
+    return "application/pdf" if filename.lower().endswith(".pdf") else "text/plain; charset=utf-8"
+
+
+async def store_original(path: str, filename: str, document_id: str, content_hash: str) -> dict:
+    """
+    Stream an uploaded file into GridFS, gzip-compressing text formats.
+    Returns the fields that link the document metadata to the stored file.
+    """
+    encoding = "identity" if filename.lower().endswith(UNCOMPRESSED_EXTENSIONS) else "gzip"
+    compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS) if encoding == "gzip" else None
+    stream = originals_bucket().open_upload_stream(filename, metadata={
+        "document_id": document_id,
+        "content_hash": content_hash,
+        "encoding": encoding,
+        "content_type": content_type_for(filename)
+    })
+    size = 0
+    try:
+        with open(path, "rb") as f:
+            while data := await run_in_threadpool(f.read, READ_CHUNK_SIZE):
+                size += len(data)
+                if compressor is not None:
+                    data = await run_in_threadpool(compressor.compress, data)
+                if data:
+                    await stream.write(data)
+        if compressor is not None:
+            await stream.write(compressor.flush())
+        await stream.close()
+    except BaseException:
+        await stream.abort()
+        raise
+    return {
+        "original_file_id": stream._id,
+        "original_size": size,
+        "original_encoding": encoding,
+        "stored_size": stream.length
+    }
+
+
+async def open_original(file_id: ObjectId):
+    """Download stream of a stored original, or None if it no longer exists"""
+    try:
+        return await originals_bucket().open_download_stream(file_id)
+    except NoFile:
+        return None
+
+
+async def iter_original(grid_out, decompress: bool) -> AsyncIterator[bytes]:
+    """Yield the stored file chunk by chunk, optionally undoing the gzip encoding"""
+    decompressor = zlib.decompressobj(GZIP_WBITS) if decompress else None
+    while chunk := await grid_out.readchunk():
+        yield decompressor.decompress(chunk) if decompressor is not None else chunk
+    if decompressor is not None:
+        yield decompressor.flush()
+
+
+async def delete_original(file_id: Optional[ObjectId]):
+    if file_id is None:
+        return
+    try:
+        await originals_bucket().delete(file_id)
+    except NoFile:
+        pass
+
+
+async def clear_originals():
+    db = async_mongo_client.rag_system
+    await db[f"{ORIGINALS_BUCKET}.files"].delete_many({})
+    await db[f"{ORIGINALS_BUCKET}.chunks"].delete_many({})
@@ -1,31 +1,385 @@
 # embeddings.py
 import os
-from typing import List
-from sentence_transformers import SentenceTransformer
+import asyncio
+import hashlib
+import fcntl
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from config import (
+    EMBEDDING_MODEL_NAME, EMBEDDING_MODEL_PATH, EMBEDDING_RUNTIME, EMBEDDING_ONNX_QUANTIZATION,
+    EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_MAX_BATCH_SIZE, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES
+)
+from utils.embedding_models import ensure_model_downloaded, load_embedding_model
 
-MODEL_NAME = "all-MiniLM-L6-v2"
-MODEL_PATH = "./all-MiniLM-L6-v2"
+WARM_UP_TEXT = "warm-up"
 
+# Loaded on first use (or by the startup warm-up) rather than at import
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
 
-def ensure_model_downloaded(model_name: str, model_path: str):
+
+def get_embedding_model():
+    """Return the embedding model, downloading and loading it on first call"""
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                # Ensure model availability, then load it from the local path
+                ensure_model_downloaded(EMBEDDING_MODEL_NAME, EMBEDDING_MODEL_PATH)
+                model = load_embedding_model(EMBEDDING_MODEL_PATH, EMBEDDING_RUNTIME, EMBEDDING_ONNX_QUANTIZATION)
+                embedding_cache.open(model.get_sentence_embedding_dimension())
+                _embedding_model = model
+                print(f"✅ Embedding model loaded ({EMBEDDING_RUNTIME} runtime).")
+    return _embedding_model
+
+
+def embedding_dimension() -> int:
+    """Vector size produced by the configured model (the collection is sized to match)"""
+    return get_embedding_model().get_sentence_embedding_dimension()
+
+
+def encode_texts(texts: List[str]):
+    """Blocking batch encode; call from a worker thread"""
+    return get_embedding_model().encode(texts)
+
+
+def warm_up_embedding_model(batch_size: int = EMBEDDING_MAX_BATCH_SIZE):
+    """Load the model and run one full-size dummy batch so the first request pays no setup cost"""
+    encode_texts([WARM_UP_TEXT] * batch_size)
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of a text for cache lookups (unicode + whitespace normalized)"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class DiskVectorStore:
+    """
+    Append-only on-disk vector store, shareable between processes.
+    Vectors live in a memory-mapped float32 file; the keys file records a
+    "key row" line per vector. Appends run under an exclusive fcntl lock and
+    take their row from the vector file size, so every process sharing the
+    directory agrees on where a vector lives. Once `max_entries` vectors are
+    stored (0 = unbounded), new ones are kept in memory only.
+    """
+
+    def __init__(self, directory: str, dim: int, max_entries: int = 0):
+        self.dim = dim
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, f"vectors_{dim}.f32")
+        self.keys_path = os.path.join(directory, f"keys_{dim}.txt")
+        self.lock_path = os.path.join(directory, f"keys_{dim}.lock")
+        self._row_bytes = dim * 4
+        self._index = {}
+        self._keys_offset = 0
+        self._keys_read = 0
+        self._mmap = None
+        self._lock = threading.Lock()
+
+        with self._file_lock():
+            # Drop a partial key line or vector bytes past the last recorded row (interrupted append)
+            with open(self.keys_path, "ab") as f:
+                pass
+            with open(self.keys_path, "rb") as f:
+                data = f.read()
+            with open(self.keys_path, "ab") as f:
+                f.truncate(data.rfind(b"\n") + 1)
+            self._load_new_keys()
+            rows = max(self._index.values(), default=-1) + 1
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(min(os.path.getsize(self.vectors_path), rows * self._row_bytes))
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_new_keys(self):
+        """Read key lines appended (by any process) since the last call"""
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode("utf-8").splitlines():
+            key, _, row = line.strip().partition(" ")
+            # Lines without a row come from the older one-key-per-row format
+            self._index[key] = int(row) if row else self._keys_read
+            self._keys_read += 1
+        self._keys_offset += end
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._index.get(key)
+            if row is None and os.path.getsize(self.keys_path) > self._keys_offset:
+                # Another process has appended since we last looked
+                self._load_new_keys()
+                row = self._index.get(key)
+            if row is None:
+                return None
+            if self._mmap is None or row >= self._mmap.shape[0]:
+                self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                       shape=(os.path.getsize(self.vectors_path) // self._row_bytes, self.dim))
+            return np.array(self._mmap[row])
+
+    def put_many(self, items: List[Tuple[str, np.ndarray]]):
+        with self._lock:
+            items = [(key, vector) for key, vector in items if key not in self._index]
+            if not items:
+                return
+            with self._file_lock():
+                self._load_new_keys()
+                row = os.path.getsize(self.vectors_path) // self._row_bytes
+                with open(self.vectors_path, "ab") as vectors_file, open(self.keys_path, "a") as keys_file:
+                    for key, vector in items:
+                        if key in self._index:
+                            continue
+                        if self.max_entries and row >= self.max_entries:
+                            break
+                        vectors_file.write(np.asarray(vector, dtype=np.float32).tobytes())
+                        vectors_file.flush()
+                        keys_file.write(f"{key} {row}\n")
+                        self._index[key] = row
+                        row += 1
+
+    def put(self, key: str, vector: np.ndarray):
+        self.put_many([(key, vector)])
+
+
+class EmbeddingCache:
     """
-    Ensure that the embedding model is downloaded locally.
-    If not found, it downloads and saves the model.
+    Two-tier embedding cache keyed by sha256(model name + normalized text):
+    a bounded in-process LRU backed by a persistent DiskVectorStore.
     """
-    if not os.path.exists(model_path):
-        print(f"📥 Downloading model '{model_name}' to '{model_path}' ...")
-        model = SentenceTransformer(model_name)
-        model.save(model_path)
-        print("✅ Model downloaded and saved locally.")
-    else:
-        print("✅ Model already exists locally.")
 
+    def __init__(self, model_name: str, max_size: int = 10000, directory: Optional[str] = None,
+                 disk_max_entries: int = 0):
+        self.model_name = model_name
+        self.max_size = max_size
+        self.directory = directory
+        self.disk_max_entries = disk_max_entries
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        # The disk tier is opened once the model (and so the vector size) is known
+        self.dim: Optional[int] = None
+        self.disk: Optional[DiskVectorStore] = None
+
+        # Metrics
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def open(self, dim: int):
+        self.dim = dim
+        if self.directory:
+            self.disk = DiskVectorStore(self.directory, dim, self.disk_max_entries)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.key(text)
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+
+        vector = self.disk.get(key) if self.disk is not None else None
+        if vector is not None:
+            self.disk_hits += 1
+            self._remember(key, vector)
+            return vector
+
+        self.misses += 1
+        return None
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up several texts; may read the disk tier, so call from a worker thread"""
+        return [self.get(text) for text in texts]
+
+    def put(self, text: str, vector: np.ndarray):
+        self.put_many([(text, vector)])
+
+    def put_many(self, items: List[Tuple[str, np.ndarray]]):
+        """Store (text, vector) pairs; appends to the disk tier, so call from a worker thread"""
+        entries = []
+        for text, vector in items:
+            key = self.key(text)
+            vector = np.asarray(vector, dtype=np.float32)
+            self._remember(key, vector)
+            entries.append((key, vector))
+        if self.disk is not None:
+            self.disk.put_many(entries)
+
+    def metrics(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._lru),
+            "disk_entries": len(self.disk) if self.disk is not None else 0,
+        }
+
+
+# Runtimes produce slightly different vectors, so non-default ones get their own cache keys
+embedding_cache = EmbeddingCache(
+    EMBEDDING_MODEL_NAME if EMBEDDING_RUNTIME == "torch" else f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_RUNTIME}",
+    max_size=EMBEDDING_CACHE_SIZE,
+    directory=EMBEDDING_CACHE_DIR or None,
+    disk_max_entries=EMBEDDING_CACHE_DISK_MAX_ENTRIES
+)
+
+
+async def aencode(texts: List[str]):
+    """
+    Encode texts in a worker thread so the event loop is not blocked
+    by the CPU-bound forward pass. Cached vectors are reused and only
+    the misses are sent to the model.
+    """
+    # Cache lookups and appends may touch the disk tier, so they also run off the event loop
+    vectors = await run_in_threadpool(embedding_cache.get_many, texts)
+
+    # Encode each distinct missing text once, even if repeated in the batch
+    missing = {}
+    for i, vector in enumerate(vectors):
+        if vector is None:
+            missing.setdefault(embedding_cache.key(texts[i]), []).append(i)
+    if missing:
+        positions = list(missing.values())
+        encoded = await run_in_threadpool(encode_texts, [texts[group[0]] for group in positions])
+        for group, vector in zip(positions, encoded):
+            for i in group:
+                vectors[i] = vector
+        await run_in_threadpool(embedding_cache.put_many,
+                                [(texts[group[0]], vector) for group, vector in zip(positions, encoded)])
+    return np.stack(vectors) if vectors else np.empty((0, embedding_dimension()), dtype=np.float32)
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching scheduler for single-text encodes.
+    Concurrent callers are gathered for up to `batch_window_ms` (or until
+    `max_batch_size` texts are queued) and encoded with one batched call.
+    """
+
+    def __init__(self, encode, max_batch_size: int = 32, batch_window_ms: float = 5.0):
+        self.encode_batch = encode
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.batches_encoded = 0
+        self.texts_encoded = 0
+        self.peak_queue_depth = 0
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def encode(self, text: str):
+        """Encode a single text, sharing the forward pass with concurrent callers"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        self.peak_queue_depth = max(self.peak_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _collect_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_window
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Skip callers that gave up while waiting
+        return [(text, future) for text, future in batch if not future.done()]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+
+            try:
+                vectors = await run_in_threadpool(self.encode_batch, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches_encoded += 1
+            self.texts_encoded += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "peak_queue_depth": self.peak_queue_depth,
+            "batches_encoded": self.batches_encoded,
+            "texts_encoded": self.texts_encoded,
+            "avg_batch_size": self.texts_encoded / self.batches_encoded if self.batches_encoded else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "batch_window_ms": self.batch_window * 1000.0,
+        }
+
+
+embedding_batcher = EmbeddingBatcher(
+    encode_texts,
+    max_batch_size=EMBEDDING_MAX_BATCH_SIZE,
+    batch_window_ms=EMBEDDING_BATCH_WINDOW_MS
+)
+
+
+async def aencode_query(text: str):
+    """Encode a single query through the cache and the shared micro-batcher"""
+    vector = await run_in_threadpool(embedding_cache.get, text)
+    if vector is None:
+        vector = await embedding_batcher.encode(text)
+        await run_in_threadpool(embedding_cache.put, text, vector)
+    return vector
 
-# Ensure model availability
-ensure_model_downloaded(MODEL_NAME, MODEL_PATH)
 
-# Load model always from local path
-embedding_model = SentenceTransformer(MODEL_PATH)
+def embedding_metrics() -> dict:
+    return {
+        "batcher": embedding_batcher.metrics(),
+        "cache": embedding_cache.metrics(),
+    }
 
 
 # def get_embedding(text: str) -> List[float]:
@@ -0,0 +1,565 @@
+# ingestion.py
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import tarfile
+import zipfile
+import asyncio
+import datetime
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import ReplaceOne
+from starlette.concurrency import run_in_threadpool
+
+from config import CHUNK_SUGGESTIONS, INGEST_BATCH_SIZE, PDF_EXTRACT_WORKERS, PDF_PAGES_PER_TASK, PDF_PAGE_TIMEOUT_SECONDS
+from models.pydantic_models import DocumentChunk
+from services.embeddings import aencode
+from services.answer_cache import answer_cache
+from services.vector_store import VectorPoint, vector_store
+from services.keyword_index import keyword_index
+from services.document_store import delete_original, store_original
+from services.suggestions import suggestion_worker
+from services.metrics import INGESTED_CHUNKS, INGESTED_FILES, INGESTED_PAGES, observe_stage, stage
+from utils.util_module import chunk_text
+from utils.pdf_extraction import aiter_pages_parallel, count_pdf_pages
+from utils.file_types import ARCHIVE_EXTENSIONS, SUPPORTED_EXTENSIONS
+
+MAX_TRACKED_JOBS = 1000
+METADATA_BATCH_SIZE = 100
+
+
+@dataclass
+class IngestionJob:
+    job_id: str
+    document_id: Optional[str] = None  # set for single-file uploads
+    filename: Optional[str] = None
+    status: str = "queued"  # queued -> running -> completed | failed
+    files_total: int = 1
+    files_processed: int = 0
+    files_failed: List[dict] = field(default_factory=list)
+    total_pages: Optional[int] = None
+    pages_processed: int = 0
+    chunks_processed: int = 0
+    chunks_unchanged: int = 0
+    chunks_deleted: int = 0
+    files_unchanged: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        if self.started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.job_id,
+            "document_id": self.document_id,
+            "filename": self.filename,
+            "status": self.status,
+            "files_total": self.files_total,
+            "files_processed": self.files_processed,
+            "files_failed": self.files_failed,
+            "total_pages": self.total_pages,
+            "pages_processed": self.pages_processed,
+            "chunks_processed": self.chunks_processed,
+            "chunks_unchanged": self.chunks_unchanged,
+            "chunks_deleted": self.chunks_deleted,
+            "files_unchanged": self.files_unchanged,
+            "elapsed_seconds": round(elapsed, 3),
+            "pages_per_second": round(self.pages_processed / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_second": round(self.chunks_processed / elapsed, 2) if elapsed else 0.0,
+            "error": self.error,
+        }
+
+
+# In-process job registry, oldest finished jobs are pruned first
+jobs: Dict[str, IngestionJob] = {}
+
+
+def _register_job(job: IngestionJob) -> IngestionJob:
+    if len(jobs) >= MAX_TRACKED_JOBS:
+        finished = [j for j in jobs.values() if j.status in ("completed", "failed")]
+        for old in sorted(finished, key=lambda j: j.created_at)[:len(jobs) - MAX_TRACKED_JOBS + 1]:
+            del jobs[old.job_id]
+    jobs[job.job_id] = job
+    return job
+
+
+def create_job(filename: str, document_id: Optional[str] = None) -> IngestionJob:
+    return _register_job(IngestionJob(job_id=str(uuid.uuid4()), document_id=document_id, filename=filename))
+
+
+def create_bulk_job(files_total: int) -> IngestionJob:
+    return _register_job(IngestionJob(job_id=str(uuid.uuid4()), files_total=files_total))
+
+
+def _content_uuid(*parts) -> str:
+    """Deterministic UUID (Qdrant point IDs must be UUIDs or integers) from a sha256 of the parts"""
+    digest = hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).digest()
+    return str(uuid.UUID(bytes=digest[:16]))
+
+
+def document_id_for(content_hash: str) -> str:
+    """ID of a new document, derived from its content"""
+    return _content_uuid("document", content_hash)
+
+
+async def resolve_document(documents_collection, filename: str, content_hash: str) -> Tuple[str, Optional[dict]]:
+    """
+    Identify an upload by its content: content that is already stored resolves
+    to that document, whatever its name. Otherwise the filename is only a hint
+    for updates: new content under a stored filename replaces that document in
+    place (keeping its ID, so unchanged chunks are reused), and anything else
+    is a new document. Returns the document ID and its stored metadata, if any.
+    """
+    projection = {"_id": 0, "document_id": 1, "filename": 1, "content_hash": 1, "original_file_id": 1}
+    existing = await documents_collection.find_one({"content_hash": content_hash}, projection)
+    if existing is None:
+        existing = await documents_collection.find_one({"filename": filename}, projection)
+    if existing is not None:
+        return existing["document_id"], existing
+    return document_id_for(content_hash), None
+
+
+def chunk_id_for(document_id: str, page_number: Optional[int], text: str) -> str:
+    return _content_uuid("chunk", document_id, page_number, text)
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _member_name(name: str) -> str:
+    """Archive member path as a document name: folders are kept so same-named members stay apart"""
+    return "/".join(part for part in name.replace("\\", "/").split("/") if part not in ("", ".", ".."))
+
+
+def _copy_to_workdir(stream, filename: str, workdir: str) -> Tuple[str, str]:
+    fd, path = tempfile.mkstemp(dir=workdir, suffix=os.path.splitext(filename)[1])
+    with os.fdopen(fd, "wb") as out:
+        shutil.copyfileobj(stream, out)
+    return _member_name(filename), path
+
+
+def _extract_archive(path: str, workdir: str) -> List[Tuple[str, str]]:
+    """Copy supported members of a zip/tar archive into workdir (member paths are never trusted)"""
+    sources = []
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.endswith(SUPPORTED_EXTENSIONS):
+                    with archive.open(info) as member:
+                        sources.append(_copy_to_workdir(member, info.filename, workdir))
+    else:
+        with tarfile.open(path) as archive:
+            for member in archive:
+                if member.isfile() and member.name.endswith(SUPPORTED_EXTENSIONS):
+                    sources.append(_copy_to_workdir(archive.extractfile(member), member.name, workdir))
+    return sources
+
+
+def expand_sources(items: List[Tuple[str, str]], workdir: str) -> List[Tuple[str, str]]:
+    """
+    Resolve (filename, path) items into the PDF/TXT files to ingest.
+    Directories are walked recursively (files are named by their path under
+    the directory's name) and archives are unpacked into workdir.
+    """
+    sources = []
+    for filename, path in items:
+        if os.path.isdir(path):
+            for root, _, names in sorted(os.walk(path)):
+                prefix = "/".join([filename] + [part for part in os.path.relpath(root, path).split(os.sep) if part != "."])
+                sources.extend(expand_sources([(f"{prefix}/{name}", os.path.join(root, name)) for name in sorted(names)],
+                                              workdir))
+        elif filename.endswith(ARCHIVE_EXTENSIONS):
+            sources.extend(_extract_archive(path, workdir))
+        elif filename.endswith(SUPPORTED_EXTENSIONS):
+            sources.append((filename, path))
+    return sources
+
+
+async def iter_pdf_pages(path: str, job: IngestionJob):
+    """Yield (text, page_number) in page order, extracting page ranges in the process pool"""
+    total_pages = await run_in_threadpool(count_pdf_pages, path)
+    job.total_pages = (job.total_pages or 0) + total_pages
+    async for page in aiter_pages_parallel(
+        path,
+        total_pages,
+        max_workers=PDF_EXTRACT_WORKERS,
+        pages_per_task=PDF_PAGES_PER_TASK,
+        page_timeout=PDF_PAGE_TIMEOUT_SECONDS
+    ):
+        yield page
+
+
+async def iter_text_pages(text: str, job: IngestionJob):
+    """A TXT upload is treated as a single page without a page number"""
+    job.total_pages = (job.total_pages or 0) + 1
+    yield text, None
+
+
+async def _upsert_batch(chunks: List[DocumentChunk], wait: bool) -> int:
+    with stage("embed", endpoint="ingestion"):
+        embeddings = await aencode([chunk.chunk_text for chunk in chunks])
+    points = [
+        VectorPoint(
+            id=chunk.chunk_id,
+            vector=embeddings[i].tolist(),
+            payload={
+                "document_id": chunk.document_id,
+                "filename": chunk.filename,
+                "text": chunk.chunk_text,
+                "page_number": chunk.page_number,
+                "upload_timestamp": chunk.upload_timestamp.isoformat()
+            }
+        )
+        for i, chunk in enumerate(chunks)
+    ]
+    with stage("upsert", endpoint="ingestion"):
+        await vector_store.upsert(points, wait=wait)
+    with stage("keyword_index", endpoint="ingestion"):
+        await keyword_index.add((chunk.chunk_id, chunk.chunk_text) for chunk in chunks)
+    if CHUNK_SUGGESTIONS:
+        # Follow-up questions are generated in the background and merged into the payload later
+        suggestion_worker.submit([(chunk.chunk_id, chunk.chunk_text) for chunk in chunks])
+    return len(chunks)
+
+
+async def delete_chunks(chunk_ids: List[str]):
+    """Remove chunks from both the vector store and the keyword index"""
+    await vector_store.delete_ids(chunk_ids)
+    await keyword_index.remove(chunk_ids)
+
+
+async def remove_document(document_id: str, documents_collection) -> Optional[int]:
+    """
+    Remove a document's points (one filtered delete), keyword index entries,
+    stored original and metadata. Returns the number of chunks removed, or
+    None when nothing is stored for the document.
+    """
+    metadata = await documents_collection.find_one({"document_id": document_id}, {"_id": 0, "original_file_id": 1})
+    chunk_ids = await vector_store.document_chunk_ids(document_id)
+    if metadata is None and not chunk_ids:
+        return None
+
+    await vector_store.delete_document(document_id)
+    await keyword_index.remove(chunk_ids)
+    await documents_collection.delete_one({"document_id": document_id})
+    if metadata is not None:
+        await delete_original(metadata.get("original_file_id"))
+    answer_cache.invalidate()
+    return len(chunk_ids)
+
+
+async def delete_replaced_original(file_id: Optional[ObjectId]):
+    """Best-effort removal of a superseded version's original; a leftover file only wastes space"""
+    try:
+        await delete_original(file_id)
+    except Exception as e:
+        print(f"⚠️ Failed to delete replaced original {file_id}: {str(e)}")
+
+
+class UpsertError(Exception):
+    """An embedding/upsert batch failed; fatal for the whole job"""
+
+
+class BatchUpserter:
+    """
+    Packs chunks into fixed-size embedding/upsert batches.
+    At most one batch is being built while the previous one is embedded and
+    upserted, so memory stays bounded regardless of corpus size.
+    """
+
+    def __init__(self, job: IngestionJob, batch_size: int, wait: bool = True):
+        self.job = job
+        self.batch_size = batch_size
+        self.wait = wait
+        self.batch: List[DocumentChunk] = []
+        self.pending: Optional[asyncio.Task] = None
+
+    async def add(self, chunk: DocumentChunk):
+        self.batch.append(chunk)
+        if len(self.batch) >= self.batch_size:
+            await self.flush()
+
+    async def _wait_pending(self):
+        if self.pending is not None:
+            task, self.pending = self.pending, None
+            try:
+                processed = await task
+            except Exception as e:
+                raise UpsertError(str(e)) from e
+            self.job.chunks_processed += processed
+            INGESTED_CHUNKS.labels("embedded").inc(processed)
+
+    async def flush(self):
+        await self._wait_pending()
+        if self.batch:
+            self.pending = asyncio.create_task(_upsert_batch(self.batch, self.wait))
+            self.batch = []
+
+    async def drain(self):
+        await self.flush()
+        await self._wait_pending()
+
+    def discard(self, filename: str):
+        """Drop chunks of a failed file that have not been sent yet"""
+        self.batch = [chunk for chunk in self.batch if chunk.filename != filename]
+
+    async def cancel(self):
+        """Stop the batch in flight and wait for it, so a rollback isn't overtaken by its upsert"""
+        if self.pending is not None:
+            task, self.pending = self.pending, None
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def _ingest_file(job: IngestionJob, upserter: BatchUpserter, documents_collection, filename: str,
+                       path: str, upload_time: datetime.datetime, new_chunk_ids: List[str],
+                       content_hash: Optional[str] = None) -> Optional[Tuple[dict, Set[str], Optional[ObjectId]]]:
+    """
+    Stream one file through page -> chunk -> upserter and store the original in GridFS.
+    Returns its metadata document, the stale chunk IDs and the original file ID
+    of the previous version, or None when the same content is already stored.
+    IDs of chunks sent to the upserter are appended to new_chunk_ids so the
+    caller can roll them back on failure.
+    """
+    if content_hash is None:
+        content_hash = await run_in_threadpool(hash_file, path)
+    document_id, existing = await resolve_document(documents_collection, filename, content_hash)
+    if job.filename == filename:
+        job.document_id = document_id
+    if existing is not None and existing.get("content_hash") == content_hash:
+        job.files_unchanged += 1
+        return None
+    existing_chunk_ids = await vector_store.document_chunk_ids(document_id) if existing is not None else set()
+
+    if filename.endswith(".pdf"):
+        pages = iter_pdf_pages(path, job)
+    else:  # TXT file
+        with open(path, "rb") as f:
+            text = (await run_in_threadpool(f.read)).decode("utf-8")
+        pages = iter_text_pages(text, job)
+
+    original = await store_original(path, filename, document_id, content_hash)
+    try:
+        seen_chunk_ids = await _chunk_pages(job, upserter, pages, document_id, filename, upload_time,
+                                            existing_chunk_ids, new_chunk_ids)
+    except BaseException:
+        await delete_original(original["original_file_id"])
+        raise
+
+    metadata = {
+        "document_id": document_id,
+        "filename": filename,
+        "content_hash": content_hash,
+        "upload_timestamp": upload_time,
+        "chunk_count": len(seen_chunk_ids),
+        **original
+    }
+    previous_original_id = existing.get("original_file_id") if existing is not None else None
+    return metadata, existing_chunk_ids - seen_chunk_ids, previous_original_id
+
+
+async def _chunk_pages(job: IngestionJob, upserter: BatchUpserter, pages, document_id: str, filename: str,
+                       upload_time: datetime.datetime, existing_chunk_ids: Set[str],
+                       new_chunk_ids: List[str]) -> Set[str]:
+    """Chunk pages and send chunks that are new in this version to the upserter; returns all chunk IDs"""
+    seen_chunk_ids = set()
+    async for text, page_num in pages:
+        for chunk in chunk_text(text or ""):
+            chunk_id = chunk_id_for(document_id, page_num, chunk)
+            if chunk_id in seen_chunk_ids:
+                continue
+            seen_chunk_ids.add(chunk_id)
+            if chunk_id in existing_chunk_ids:
+                # Unchanged chunk from the previous version: nothing to embed
+                job.chunks_unchanged += 1
+                INGESTED_CHUNKS.labels("unchanged").inc()
+                continue
+            new_chunk_ids.append(chunk_id)
+            await upserter.add(DocumentChunk(
+                document_id=document_id,
+                filename=filename,
+                chunk_id=chunk_id,
+                chunk_text=chunk,
+                page_number=page_num,
+                upload_timestamp=upload_time
+            ))
+        job.pages_processed += 1
+        INGESTED_PAGES.inc()
+    return seen_chunk_ids
+
+
+async def run_ingestion_job(job: IngestionJob, path: str, documents_collection, content_hash: Optional[str] = None):
+    """Ingest a single stored upload in the background"""
+    job.status = "running"
+    job.started_at = time.time()
+    upserter = BatchUpserter(job, INGEST_BATCH_SIZE)
+    new_chunk_ids: List[str] = []
+    result = None
+
+    try:
+        result = await _ingest_file(job, upserter, documents_collection, job.filename, path,
+                                    datetime.datetime.utcnow(), new_chunk_ids, content_hash)
+        await upserter.drain()
+
+        changed = result is not None
+        if changed:
+            metadata, stale_chunk_ids, previous_original_id = result
+            await delete_chunks(list(stale_chunk_ids))
+            job.chunks_deleted += len(stale_chunk_ids)
+            INGESTED_CHUNKS.labels("deleted").inc(len(stale_chunk_ids))
+            await documents_collection.replace_one({"document_id": metadata["document_id"]}, metadata, upsert=True)
+            answer_cache.invalidate()
+        job.files_processed = 1
+        job.status = "completed"
+        INGESTED_FILES.labels("completed" if changed else "unchanged").inc()
+
+    except Exception as e:
+        job.status = "failed"
+        job.error = f"Error processing document: {str(e)}"
+        INGESTED_FILES.labels("failed").inc()
+        await upserter.cancel()
+        # Remove the chunks and original this upload added; the previous version stays intact
+        try:
+            await delete_chunks(new_chunk_ids)
+            if result is not None:
+                await delete_original(result[0]["original_file_id"])
+        except Exception:
+            pass
+
+    else:
+        # Committed: the previous original is unreferenced now, and failing to remove it must not undo the upload
+        if changed:
+            await delete_replaced_original(previous_original_id)
+
+    finally:
+        job.finished_at = time.time()
+        observe_stage("job", job.finished_at - job.started_at, endpoint="ingestion")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def run_bulk_ingestion_job(job: IngestionJob, sources: List[Tuple[str, str]], documents_collection,
+                                 cleanup_dir: Optional[str] = None):
+    """
+    Ingest many files as one job. Chunks from all files share full-size
+    embedding batches, Qdrant upserts don't wait for indexing, and metadata
+    is written in batched bulk writes. A file that fails to parse, or that
+    repeats the name of an earlier file in the job, is skipped and reported in
+    files_failed without aborting the rest; repeated content is ingested once.
+    """
+    job.status = "running"
+    job.started_at = time.time()
+    job.files_total = len(sources)
+    upload_time = datetime.datetime.utcnow()
+    upserter = BatchUpserter(job, INGEST_BATCH_SIZE, wait=False)
+    pending_metadata: List[dict] = []
+    replaced_originals: List[ObjectId] = []
+    stale_chunk_ids: List[str] = []
+    failed_chunk_ids: List[str] = []
+    # Chunks of the files in pending_metadata, rolled back if the job fails before it is written
+    pending_chunk_ids: List[str] = []
+    # Metadata is written in batches, so earlier files of this job are not visible to resolve_document yet
+    seen_filenames: Set[str] = set()
+    seen_hashes: Set[str] = set()
+
+    async def write_metadata():
+        nonlocal pending_metadata, pending_chunk_ids, replaced_originals
+        if pending_metadata:
+            await documents_collection.bulk_write([
+                ReplaceOne({"document_id": metadata["document_id"]}, metadata, upsert=True)
+                for metadata in pending_metadata
+            ], ordered=False)
+            pending_metadata = []
+            pending_chunk_ids = []
+            for file_id in replaced_originals:
+                await delete_replaced_original(file_id)
+            replaced_originals = []
+
+    try:
+        for filename, path in sources:
+            new_chunk_ids: List[str] = []
+            if filename in seen_filenames:
+                job.files_failed.append({"filename": filename, "error": "Another file in this upload has the same name"})
+                INGESTED_FILES.labels("failed").inc()
+                job.files_processed += 1
+                continue
+            seen_filenames.add(filename)
+            try:
+                content_hash = await run_in_threadpool(hash_file, path)
+                if content_hash in seen_hashes:
+                    job.files_unchanged += 1
+                    INGESTED_FILES.labels("unchanged").inc()
+                    job.files_processed += 1
+                    continue
+                seen_hashes.add(content_hash)
+                result = await _ingest_file(job, upserter, documents_collection, filename, path,
+                                            upload_time, new_chunk_ids, content_hash)
+                if result is not None:
+                    metadata, stale, previous_original_id = result
+                    pending_metadata.append(metadata)
+                    pending_chunk_ids.extend(new_chunk_ids)
+                    stale_chunk_ids.extend(stale)
+                    if previous_original_id is not None:
+                        replaced_originals.append(previous_original_id)
+                INGESTED_FILES.labels("unchanged" if result is None else "completed").inc()
+            except UpsertError:
+                # Also roll back the chunks this file had sent so far
+                failed_chunk_ids.extend(new_chunk_ids)
+                raise
+            except Exception as e:
+                upserter.discard(filename)
+                failed_chunk_ids.extend(new_chunk_ids)
+                job.files_failed.append({"filename": filename, "error": str(e)})
+                INGESTED_FILES.labels("failed").inc()
+            job.files_processed += 1
+
+            if len(pending_metadata) >= METADATA_BATCH_SIZE:
+                await write_metadata()
+
+        await upserter.drain()
+        await write_metadata()
+
+        # Chunks of failed files may already have been sent in an earlier batch
+        await delete_chunks(stale_chunk_ids + failed_chunk_ids)
+        job.chunks_deleted += len(stale_chunk_ids)
+        INGESTED_CHUNKS.labels("deleted").inc(len(stale_chunk_ids))
+
+        job.status = "completed"
+
+    except Exception as e:
+        job.status = "failed"
+        job.error = f"Error processing documents: {str(e)}"
+        await upserter.cancel()
+        # Chunks and originals of files whose metadata was never written are unreferenced,
+        # and chunks of failed files may already have been sent
+        try:
+            await delete_chunks(pending_chunk_ids + failed_chunk_ids)
+        except Exception:
+            pass
+        for metadata in pending_metadata:
+            try:
+                await delete_original(metadata["original_file_id"])
+            except Exception:
+                pass
+
+    finally:
+        answer_cache.invalidate()
+        job.finished_at = time.time()
+        observe_stage("bulk_job", job.finished_at - job.started_at, endpoint="ingestion")
+        if cleanup_dir:
+            shutil.rmtree(cleanup_dir, ignore_errors=True)
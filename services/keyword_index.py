@@ -0,0 +1,250 @@
+# keyword_index.py
+import os
+import re
+import json
+import math
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from config import KEYWORD_INDEX_DIR, BM25_K1, BM25_B
+
+# Keep dotted/hyphenated codes such as "3.2", "fig-4" or "gdp-2023" as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class KeywordIndex:
+    """
+    Incremental BM25 inverted index over chunk texts.
+    Each chunk gets a dense internal doc number; postings are parallel
+    array('I') doc numbers / array('H') term frequencies per term. Deleted
+    chunks are tombstoned and physically dropped when the log is compacted;
+    at runtime that happens in a worker thread while searches keep using the
+    current postings. Mutations are appended to a JSON-lines log that is
+    replayed on load.
+    """
+
+    def __init__(self, directory: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        # Ops applied while a background compaction runs (None when idle), replayed onto its result
+        self._compaction_ops: Optional[List[dict]] = None
+        self._generation = 0
+        self._reset()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    def _reset(self):
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._chunk_ids: List[Optional[str]] = []  # doc number -> chunk id (None once deleted)
+        self._doc_lengths = array("I")
+        self._alive = bytearray()
+        self._numbers: Dict[str, int] = {}
+        self._live_count = 0
+        self._total_length = 0
+        self._pending_ops: List[dict] = []
+
+    # -- persistence ---------------------------------------------------------
+
+    @property
+    def _log_path(self):
+        return os.path.join(self.directory, "keywords.jsonl")
+
+    def _load(self):
+        if not os.path.exists(self._log_path):
+            return
+        ops = 0
+        with open(self._log_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                op = json.loads(line)
+                ops += 1
+                if op["op"] == "add":
+                    self._add(op["id"], op["terms"])
+                elif op["op"] == "del":
+                    self._remove(op["id"])
+        self._pending_ops = []
+        if ops > 2 * self._live_count + 1000:
+            self._compact()
+
+    def _rebuild(self, postings: List[Tuple[str, Tuple[array, array]]],
+                 chunk_ids: List[Optional[str]]) -> "KeywordIndex":
+        """
+        A new index holding the live chunks among `chunk_ids` (doc numbers past
+        its end are ignored, so postings may still grow meanwhile), with its
+        compacted log written next to the current one.
+        """
+        terms_by_number = {number: {} for number, chunk_id in enumerate(chunk_ids) if chunk_id is not None}
+        for term, (numbers, tfs) in postings:
+            for number, tf in zip(numbers, tfs):
+                if number in terms_by_number:
+                    terms_by_number[number][term] = tf
+
+        fresh = KeywordIndex(k1=self.k1, b=self.b)
+        for number, terms in terms_by_number.items():
+            fresh._add(chunk_ids[number], terms)
+        if self.directory:
+            with open(self._log_path + ".tmp", "w") as f:
+                f.write("".join(json.dumps(op) + "\n" for op in fresh._pending_ops))
+        fresh._pending_ops = []
+        return fresh
+
+    def _adopt(self, fresh: "KeywordIndex"):
+        """Take over a rebuilt index's postings and its compacted log"""
+        for name in ("_postings", "_chunk_ids", "_doc_lengths", "_alive", "_numbers", "_live_count", "_total_length"):
+            setattr(self, name, getattr(fresh, name))
+        self._pending_ops = []
+        if self.directory:
+            os.replace(self._log_path + ".tmp", self._log_path)
+
+    def _compact(self):
+        """Rebuild postings (and the log) without tombstoned chunks"""
+        self._adopt(self._rebuild(list(self._postings.items()), list(self._chunk_ids)))
+
+    async def _compact_async(self):
+        """
+        Compact in a worker thread. It works from a snapshot of the doc numbers
+        and chunk IDs; ops applied meanwhile are recorded and replayed onto the
+        rebuilt index, which then replaces the current one.
+        """
+        generation = self._generation
+        self._compaction_ops = []
+        try:
+            fresh = await run_in_threadpool(self._rebuild, list(self._postings.items()), list(self._chunk_ids))
+        finally:
+            ops, self._compaction_ops = self._compaction_ops, None
+        if generation != self._generation:
+            # Cleared meanwhile: the rebuilt index is stale
+            if self.directory and os.path.exists(self._log_path + ".tmp"):
+                os.remove(self._log_path + ".tmp")
+            return
+        self._adopt(fresh)
+        for op in ops:
+            if op["op"] == "add":
+                self._add(op["id"], op["terms"])
+            else:
+                self._remove(op["id"])
+        await self._persist()
+
+    def _append_log(self, lines: str):
+        with open(self._log_path, "a") as f:
+            f.write(lines)
+
+    async def _persist(self):
+        if not self.directory or not self._pending_ops:
+            self._pending_ops = []
+            return
+        lines = "".join(json.dumps(op) + "\n" for op in self._pending_ops)
+        self._pending_ops = []
+        await run_in_threadpool(self._append_log, lines)
+
+    # -- mutation ------------------------------------------------------------
+
+    def _add(self, chunk_id: str, terms: Dict[str, int]):
+        if chunk_id in self._numbers:
+            self._remove(chunk_id)
+        number = len(self._chunk_ids)
+        self._chunk_ids.append(chunk_id)
+        self._numbers[chunk_id] = number
+        length = sum(terms.values())
+        self._doc_lengths.append(length)
+        self._alive.append(1)
+        self._live_count += 1
+        self._total_length += length
+        for term, tf in terms.items():
+            numbers, tfs = self._postings.setdefault(term, (array("I"), array("H")))
+            numbers.append(number)
+            tfs.append(min(tf, 65535))
+        self._record({"op": "add", "id": chunk_id, "terms": terms})
+
+    def _remove(self, chunk_id: str):
+        number = self._numbers.pop(chunk_id, None)
+        if number is None:
+            return
+        self._chunk_ids[number] = None
+        self._alive[number] = 0
+        self._live_count -= 1
+        self._total_length -= self._doc_lengths[number]
+        self._record({"op": "del", "id": chunk_id})
+
+    def _record(self, op: dict):
+        self._pending_ops.append(op)
+        if self._compaction_ops is not None:
+            self._compaction_ops.append(op)
+
+    async def add(self, chunks: Iterable[Tuple[str, str]]):
+        """Index (chunk_id, text) pairs"""
+        for chunk_id, text in chunks:
+            self._add(chunk_id, dict(Counter(tokenize(text))))
+        await self._persist()
+
+    async def remove(self, chunk_ids: Iterable[str]):
+        for chunk_id in chunk_ids:
+            self._remove(chunk_id)
+        await self._persist()
+        if self._compaction_ops is None and len(self._chunk_ids) - self._live_count > max(self._live_count, 1000):
+            await self._compact_async()
+
+    async def clear(self):
+        self._generation += 1
+        self._reset()
+        if self.directory and os.path.exists(self._log_path):
+            os.remove(self._log_path)
+
+    # -- query ---------------------------------------------------------------
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        """Top `limit` (chunk_id, bm25 score) pairs for a query"""
+        if self._live_count == 0 or limit <= 0:
+            return []
+        n_docs = len(self._chunk_ids)
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.float32)
+        avg_length = self._total_length / self._live_count or 1.0
+        alive = np.frombuffer(self._alive, dtype=np.uint8)
+        scores = np.zeros(n_docs, dtype=np.float32)
+
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            numbers = np.frombuffer(postings[0], dtype=np.uint32)
+            tfs = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+            df = int(np.count_nonzero(alive[numbers]))
+            if df == 0:
+                continue
+            idf = math.log(1 + (self._live_count - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[numbers] / avg_length)
+            scores[numbers] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        scores *= alive
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) == 0:
+            return []
+        k = min(limit, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self._chunk_ids[i], float(scores[i])) for i in top]
+
+    def __len__(self):
+        return self._live_count
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merge ranked ID lists: score(id) = sum over lists of 1 / (k + rank)"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, 1):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+keyword_index = KeywordIndex(KEYWORD_INDEX_DIR or None, k1=BM25_K1, b=BM25_B)
@@ -0,0 +1,270 @@
+# llm_gateway.py
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Deque, List, Optional
+from fastapi import HTTPException
+from services.metrics import LLM_ADMITTED, LLM_EJECTIONS, LLM_IN_FLIGHT, LLM_REJECTED, LLM_WAITING, stage
+from config import (
+    LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT_SECONDS, LLM_EJECT_AFTER_FAILURES, LLM_EJECT_SECONDS,
+    ollama_llms, ollama_json_llms
+)
+
+# Assumed call duration until one has completed, and the weight of each new one in the running average
+INITIAL_CALL_SECONDS = 5.0
+CALL_SECONDS_SMOOTHING = 0.2
+
+# Default priority of calls made in the current context, see LLMGateway.background_priority
+_background_calls: ContextVar[bool] = ContextVar("llm_background_calls", default=False)
+
+
+class LLMOverloaded(HTTPException):
+    """No Ollama capacity for a call: 429 when the wait queue is full, 503 when no server is free in time"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+        self.retry_after = retry_after
+
+
+@dataclass
+class LLMBackend:
+    name: str
+    llm: Any
+    json_llm: Any
+    in_flight: int = 0
+    calls: int = 0
+    failures: int = 0  # consecutive
+    ejected_until: float = 0.0
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+
+class Admission:
+    """A request's place in the gateway, held until its last LLM call is done; release() is idempotent"""
+
+    def __init__(self, gateway: "LLMGateway"):
+        self._gateway = gateway
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._gateway._admitted -= 1
+            LLM_ADMITTED.set(self._gateway._admitted)
+
+
+class LLMGateway:
+    """
+    Admission control and load balancing in front of a pool of Ollama servers.
+    Each server runs at most `max_concurrency` generations and a call goes to
+    the available server with the fewest in flight; other calls wait in FIFO
+    order for up to `queue_timeout` seconds (then 503). Requests are admitted
+    before their first call: once as many are in progress as there are slots
+    plus `max_queue`, new ones are rejected right away with 429, and with 503
+    while every server is ejected, both with a Retry-After estimated from
+    recent call durations. An admitted request is never turned away halfway
+    for a full queue. Background calls need no admission, wait without limit
+    and only get slots no request call is waiting for. A server failing
+    `eject_after` calls in a row (0 disables ejection) is left out for
+    `eject_seconds`; after that one more failure ejects it again and a
+    success restores it fully.
+    """
+
+    def __init__(self, backends: List[LLMBackend], max_concurrency: int = 4, max_queue: int = 32,
+                 queue_timeout: float = 15.0, eject_after: int = 3, eject_seconds: float = 30.0):
+        self.backends = backends
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._background: Deque[asyncio.Future] = deque()
+        self._admitted = 0
+        self._call_seconds = INITIAL_CALL_SECONDS
+
+    # -- slots ---------------------------------------------------------------
+
+    def _pick(self) -> Optional[LLMBackend]:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b.available(now) and b.in_flight < self.max_concurrency]
+        # Ties go to the server with the fewest calls so far, so light load still rotates
+        return min(candidates, key=lambda b: (b.in_flight, b.calls), default=None)
+
+    def _take(self, backend: LLMBackend) -> LLMBackend:
+        backend.in_flight += 1
+        backend.calls += 1
+        LLM_IN_FLIGHT.labels(backend.name).set(backend.in_flight)
+        return backend
+
+    def _release(self, backend: LLMBackend):
+        backend.in_flight -= 1
+        LLM_IN_FLIGHT.labels(backend.name).set(backend.in_flight)
+        self._dispatch()
+
+    def _update_waiting(self):
+        LLM_WAITING.labels("request").set(len(self._waiters))
+        LLM_WAITING.labels("background").set(len(self._background))
+
+    def _dispatch(self):
+        """Hand free slots to waiting calls, requests before background calls"""
+        try:
+            for queue in (self._waiters, self._background):
+                while queue:
+                    if queue[0].done():  # caller gave up
+                        queue.popleft()
+                        continue
+                    backend = self._pick()
+                    if backend is None:
+                        return
+                    queue.popleft().set_result(self._take(backend))
+        finally:
+            self._update_waiting()
+
+    def _abandon(self, queue: Deque[asyncio.Future], future: asyncio.Future):
+        if future.done() and not future.cancelled():
+            # A slot was handed over just as the caller gave up; pass it on
+            self._release(future.result())
+            return
+        future.cancel()
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        self._update_waiting()
+
+    # -- admission -----------------------------------------------------------
+
+    def _capacity(self, now: float) -> int:
+        return sum(1 for b in self.backends if b.available(now)) * self.max_concurrency
+
+    def _retry_after(self) -> int:
+        """Seconds until the requests in progress now have roughly been served"""
+        now = time.monotonic()
+        capacity = self._capacity(now)
+        if not capacity:
+            return max(1, math.ceil(min(b.ejected_until for b in self.backends) - now))
+        return max(1, math.ceil(self._call_seconds * (self._admitted / capacity + 1)))
+
+    def _reject(self, status_code: int, reason: str, detail: str):
+        LLM_REJECTED.labels(reason).inc()
+        raise LLMOverloaded(status_code, detail, self._retry_after())
+
+    def admit(self) -> Admission:
+        """Admit a request that will call the LLM, or raise LLMOverloaded; release the ticket when done"""
+        capacity = self._capacity(time.monotonic())
+        if not capacity:
+            self._reject(503, "unavailable", "No LLM server is available")
+        if self._admitted >= capacity + self.max_queue:
+            self._reject(429, "queue_full", "Too many requests are waiting for the LLM")
+        self._admitted += 1
+        LLM_ADMITTED.set(self._admitted)
+        return Admission(self)
+
+    async def _acquire(self, background: bool) -> LLMBackend:
+        self._dispatch()
+        if not (self._waiters or (background and self._background)):
+            backend = self._pick()
+            if backend is not None:
+                return self._take(backend)
+
+        queue = self._background if background else self._waiters
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        self._update_waiting()
+        try:
+            await asyncio.wait([future], timeout=None if background else self.queue_timeout)
+        except BaseException:
+            self._abandon(queue, future)
+            raise
+        if not future.done():
+            self._abandon(queue, future)
+            self._reject(503, "timeout", "Timed out waiting for a free LLM slot")
+        return future.result()
+
+    # -- health --------------------------------------------------------------
+
+    def _succeeded(self, backend: LLMBackend, seconds: float):
+        backend.failures = 0
+        self._call_seconds += CALL_SECONDS_SMOOTHING * (seconds - self._call_seconds)
+
+    def _failed(self, backend: LLMBackend):
+        backend.failures += 1
+        now = time.monotonic()
+        if self.eject_after <= 0 or backend.failures < self.eject_after or not backend.available(now):
+            return
+        backend.ejected_until = now + self.eject_seconds
+        LLM_EJECTIONS.labels(backend.name).inc()
+        print(f"⚠️ Ollama server {backend.name} failed {backend.failures} calls in a row, "
+              f"ejected for {self.eject_seconds:g}s")
+        # Waiting calls may get its slots once it is back
+        asyncio.get_running_loop().call_later(self.eject_seconds, self._dispatch)
+
+    @contextmanager
+    def background_priority(self):
+        """Run the enclosed calls, and tasks started inside, at background priority unless a call says otherwise"""
+        token = _background_calls.set(True)
+        try:
+            yield
+        finally:
+            _background_calls.reset(token)
+
+    @asynccontextmanager
+    async def slot(self, background: Optional[bool] = None):
+        """Hold a generation slot on the least-loaded available server for the enclosed call"""
+        if background is None:
+            background = _background_calls.get()
+        with stage("llm_queue"):
+            backend = await self._acquire(background)
+        started = time.perf_counter()
+        try:
+            yield backend
+        except Exception:
+            self._failed(backend)
+            raise
+        else:
+            self._succeeded(backend, time.perf_counter() - started)
+        finally:
+            self._release(backend)
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        return {
+            "backends": [
+                {
+                    "name": b.name,
+                    "in_flight": b.in_flight,
+                    "calls": b.calls,
+                    "consecutive_failures": b.failures,
+                    "ejected_for_seconds": round(max(b.ejected_until - now, 0.0), 1),
+                }
+                for b in self.backends
+            ],
+            "admitted_requests": self._admitted,
+            "waiting": len(self._waiters),
+            "background_waiting": len(self._background),
+            "avg_call_seconds": round(self._call_seconds, 3),
+        }
+
+
+def build_llm_gateway() -> LLMGateway:
+    backends = [
+        LLMBackend(name=getattr(llm, "base_url", None) or f"backend-{i}", llm=llm, json_llm=json_llm)
+        for i, (llm, json_llm) in enumerate(zip(ollama_llms, ollama_json_llms))
+    ]
+    return LLMGateway(
+        backends,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        max_queue=LLM_MAX_QUEUE,
+        queue_timeout=LLM_QUEUE_TIMEOUT_SECONDS,
+        eject_after=LLM_EJECT_AFTER_FAILURES,
+        eject_seconds=LLM_EJECT_SECONDS
+    )
+
+
+llm_gateway = build_llm_gateway()
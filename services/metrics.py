@@ -0,0 +1,140 @@
+# metrics.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, List, Optional, Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.datastructures import MutableHeaders
+
+# LLM calls take seconds, so extend the default buckets upwards
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "rag_request_duration_seconds", "End-to-end latency of instrumented endpoints",
+    ["endpoint"], buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "rag_stage_duration_seconds", "Latency of individual pipeline stages",
+    ["endpoint", "stage"], buckets=LATENCY_BUCKETS
+)
+LLM_CALLS = Counter("rag_llm_calls_total", "Ollama calls", ["call"])
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Tokens processed by Ollama calls", ["call", "type"])
+LLM_IN_FLIGHT = Gauge("rag_llm_in_flight", "Ollama generations in flight", ["backend"])
+LLM_ADMITTED = Gauge("rag_llm_admitted_requests", "Requests admitted by LLM admission control and not finished")
+LLM_WAITING = Gauge("rag_llm_waiting", "Ollama calls waiting for a free slot", ["priority"])
+LLM_REJECTED = Counter("rag_llm_rejected_total", "Ollama calls turned away by admission control", ["reason"])
+LLM_EJECTIONS = Counter("rag_llm_backend_ejections_total", "Ollama servers taken out of the pool", ["backend"])
+PROMPT_TOKENS = Histogram(
+    "rag_prompt_tokens", "Estimated tokens per section of assembled RAG prompts",
+    ["section"], buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+)
+CONVERSATION_BUFFER_PENDING = Gauge(
+    "rag_conversation_buffer_pending", "Conversation records queued for writing to MongoDB"
+)
+CONVERSATION_RECORDS = Counter("rag_conversation_records_written_total", "Conversation records written to MongoDB")
+SUGGESTION_QUEUE = Gauge("rag_suggestion_queue", "Chunks waiting for follow-up question generation")
+CHUNK_SUGGESTIONS = Counter("rag_chunk_suggestions_total", "Chunks handled by the suggestion worker", ["outcome"])
+SUGGESTION_SOURCE = Counter("rag_suggestions_total", "Follow-up suggestions served by source", ["source"])
+INGESTED_FILES = Counter("rag_ingested_files_total", "Files handled by ingestion jobs", ["status"])
+INGESTED_PAGES = Counter("rag_ingested_pages_total", "Pages extracted by ingestion jobs")
+INGESTED_CHUNKS = Counter("rag_ingested_chunks_total", "Chunks handled by ingestion jobs", ["outcome"])
+
+
+class Trace:
+    """Stage timings collected for one request"""
+
+    __slots__ = ("endpoint", "stages")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.stages: List[Tuple[str, float]] = []
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("rag_trace", default=None)
+
+
+def observe_stage(name: str, seconds: float, endpoint: Optional[str] = None):
+    """
+    Record a stage duration. Without an explicit endpoint it is attributed to
+    the request being traced (and added to its timing breakdown), if any.
+    """
+    trace = _current_trace.get() if endpoint is None else None
+    if trace is not None:
+        trace.stages.append((name, seconds))
+        endpoint = trace.endpoint
+    STAGE_LATENCY.labels(endpoint or "background", name).observe(seconds)
+
+
+def detach_trace():
+    """Stop attributing stages to the current request, for background tasks spawned by a handler"""
+    _current_trace.set(None)
+
+
+@contextmanager
+def stage(name: str, endpoint: Optional[str] = None):
+    """Time the enclosed block as a pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started, endpoint)
+
+
+def record_llm_usage(call: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    LLM_CALLS.labels(call).inc()
+    if prompt_tokens:
+        LLM_TOKENS.labels(call, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(call, "completion").inc(completion_tokens)
+
+
+def metrics_response_body() -> Tuple[bytes, str]:
+    """Prometheus text exposition of this process's metrics and its content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware that traces the given paths: end-to-end latency is
+    observed when the response body completes (before any background task),
+    and the stage breakdown can be returned in a Server-Timing header.
+    Other paths pass straight through.
+    """
+
+    def __init__(self, app, paths: Iterable[str], server_timing_header: bool = False):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.server_timing_header = server_timing_header
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path")
+        if scope["type"] != "http" or path not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(path)
+        token = _current_trace.set(trace)
+        started = time.perf_counter()
+        finished = False
+
+        async def send_with_timing(message):
+            nonlocal finished
+            if message["type"] == "http.response.start" and self.server_timing_header:
+                MutableHeaders(scope=message).append("Server-Timing", trace.server_timing(time.perf_counter() - started))
+            elif message["type"] == "http.response.body" and not message.get("more_body", False) and not finished:
+                finished = True
+                REQUEST_LATENCY.labels(path).observe(time.perf_counter() - started)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if not finished:
+                REQUEST_LATENCY.labels(path).observe(time.perf_counter() - started)
+            _current_trace.reset(token)
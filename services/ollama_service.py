@@ -1,13 +1,85 @@
-
+import time
+from typing import Optional
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.messages import SystemMessage, HumanMessage
 from config import ollama_llm
+from services.llm_gateway import llm_gateway
+from services.metrics import observe_stage, record_llm_usage, stage
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Records Ollama's prompt/completion token counts for a named call"""
+
+    run_inline = True  # cheap counter updates, no need for an executor hop
+
+    def __init__(self, call: str):
+        self.call = call
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                info = generation.generation_info or {}
+                record_llm_usage(self.call, info.get("prompt_eval_count"), info.get("eval_count"))
+
+
+_usage_callbacks = {}
+
+
+def _callbacks(call: str) -> dict:
+    if call not in _usage_callbacks:
+        _usage_callbacks[call] = {"callbacks": [TokenUsageCallback(call)]}
+    return _usage_callbacks[call]
 
-def ollama_response(system_prompt: str, user_prompt: str):
-    response = ollama_llm.invoke([
+
+def _build_messages(system_prompt: str, user_prompt: str):
+    return [
         SystemMessage(content=system_prompt),
         HumanMessage(content=user_prompt)
-    ])
+    ]
+
+
+def _response_text(response) -> str:
     return response.content if hasattr(response, "content") else str(response)
 
-       
-   
\ No newline at end of file
+
+def ollama_response(system_prompt: str, user_prompt: str, call: str = "chat"):
+    """Blocking call to the first Ollama server, for scripts; bypasses the gateway's admission control"""
+    with stage(f"llm_{call}"):
+        response = ollama_llm.invoke(_build_messages(system_prompt, user_prompt), config=_callbacks(call))
+    return _response_text(response)
+
+
+async def aollama_response(system_prompt: str, user_prompt: str, call: str = "chat",
+                           background: Optional[bool] = None):
+    """
+    Non-blocking variant of ollama_response for use inside async handlers, sent
+    through the LLM gateway (`background` calls yield to waiting requests;
+    None keeps the priority of the current context)
+    """
+    async with llm_gateway.slot(background) as backend:
+        with stage(f"llm_{call}"):
+            response = await backend.llm.ainvoke(_build_messages(system_prompt, user_prompt), config=_callbacks(call))
+    return _response_text(response)
+
+
+async def aollama_stream(system_prompt: str, user_prompt: str, call: str = "chat"):
+    """Yield answer text chunks from Ollama as they are generated"""
+    started = time.perf_counter()
+    first_token = True
+    async with llm_gateway.slot() as backend:
+        with stage(f"llm_{call}"):
+            async for chunk in backend.llm.astream(_build_messages(system_prompt, user_prompt), config=_callbacks(call)):
+                text = _response_text(chunk)
+                if text:
+                    if first_token:
+                        observe_stage(f"llm_{call}_first_token", time.perf_counter() - started)
+                        first_token = False
+                    yield text
+
+
+async def aollama_json_response(system_prompt: str, user_prompt: str, call: str = "structured"):
+    """Like aollama_response, but the model is constrained to emit a JSON document"""
+    async with llm_gateway.slot() as backend:
+        with stage(f"llm_{call}"):
+            response = await backend.json_llm.ainvoke(_build_messages(system_prompt, user_prompt), config=_callbacks(call))
+    return _response_text(response)
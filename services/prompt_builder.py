@@ -0,0 +1,112 @@
+# prompt_builder.py
+import math
+from typing import Dict, List, Optional, Tuple
+from services.metrics import PROMPT_TOKENS
+from config import PROMPT_TOKEN_BUDGET, PROMPT_HISTORY_TOKENS, PROMPT_CHARS_PER_TOKEN
+
+# Smallest leftover budget worth spending on a truncated history turn or context chunk
+MIN_PARTIAL_TOKENS = 32
+
+QUESTION_TEMPLATE = """Current question: {question}
+
+Please provide a detailed answer based on the document context. Explain your reasoning."""
+SECTION_HEADERS = ("Summary of earlier conversation:\n", "Previous conversation:\n", "Document context:\n")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Approximate token count; Ollama does not expose its tokenizer, so use a characters-per-token ratio"""
+    return math.ceil(len(text) / PROMPT_CHARS_PER_TOKEN) if text else 0
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, on a word boundary"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 1:
+        return ""
+    cut = text[:int((max_tokens - 1) * PROMPT_CHARS_PER_TOKEN)]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + " ..."
+
+
+def _format_turn(turn: dict) -> str:
+    return f"Q: {turn['question']}\nA: {turn['answer']}"
+
+
+def _fit_context(chunks: List[str], budget: int) -> List[str]:
+    """Top-ranked chunks that fit the budget, truncating the one that crosses it"""
+    fitted = []
+    for chunk in chunks:
+        tokens = estimate_tokens(chunk) + 1
+        if tokens <= budget:
+            fitted.append(chunk)
+            budget -= tokens
+            continue
+        if budget >= MIN_PARTIAL_TOKENS or not fitted:
+            fitted.append(truncate_to_tokens(chunk, budget - 1))
+        break
+    return fitted
+
+
+def _fit_history(turns: List[dict], budget: int) -> List[str]:
+    """Newest turns that fit the budget, returned oldest first"""
+    fitted = []
+    for turn in turns:
+        text = _format_turn(turn)
+        tokens = estimate_tokens(text) + 1
+        if tokens <= budget:
+            fitted.append(text)
+            budget -= tokens
+            continue
+        if budget >= MIN_PARTIAL_TOKENS:
+            fitted.append(truncate_to_tokens(text, budget - 1))
+        break
+    return list(reversed(fitted))
+
+
+def build_user_prompt(system_prompt: str, question: str, context_chunks: List[str],
+                      history: List[dict], summary: Optional[str] = None,
+                      token_budget: int = PROMPT_TOKEN_BUDGET) -> Tuple[str, str]:
+    """
+    Assemble the RAG user prompt within an estimated token budget shared with
+    the system prompt. The question is always kept; context chunks (in rank
+    order) get everything except a reserve for history, and the rolling summary
+    and newest turns (`history`, newest first) get whatever context left over.
+    Returns the prompt and the context text it includes.
+    """
+    question_text = QUESTION_TEMPLATE.format(question=question)
+    fixed_tokens = (estimate_tokens(system_prompt) + estimate_tokens(question_text)
+                    + estimate_tokens("\n\n".join(SECTION_HEADERS + ("",))))
+    available = max(token_budget - fixed_tokens, 0)
+
+    history_reserve = min(PROMPT_HISTORY_TOKENS, available // 2) if (history or summary) else 0
+    context_parts = _fit_context(context_chunks, available - history_reserve)
+    context_text = "\n\n".join(context_parts)
+
+    history_budget = available - estimate_tokens(context_text)
+    summary_text = truncate_to_tokens(summary, history_budget) if summary else ""
+    history_budget -= estimate_tokens(summary_text)
+    history_text = "\n".join(_fit_history(history, history_budget))
+
+    sections = []
+    if summary_text:
+        sections.append(SECTION_HEADERS[0] + summary_text)
+    sections.append(SECTION_HEADERS[1] + history_text)
+    sections.append(SECTION_HEADERS[2] + context_text)
+    sections.append(question_text)
+    user_prompt = "\n\n".join(sections)
+
+    section_tokens: Dict[str, int] = {
+        "system": estimate_tokens(system_prompt),
+        "summary": estimate_tokens(summary_text),
+        "history": estimate_tokens(history_text),
+        "context": estimate_tokens(context_text),
+        "question": estimate_tokens(question_text),
+        "total": estimate_tokens(system_prompt) + estimate_tokens(user_prompt),
+    }
+    for section, tokens in section_tokens.items():
+        PROMPT_TOKENS.labels(section).observe(tokens)
+
+    return user_prompt, context_text
@@ -0,0 +1,96 @@
+# startup.py
+import time
+import asyncio
+from typing import Dict
+from starlette.concurrency import run_in_threadpool
+
+from services.embeddings import embedding_dimension, warm_up_embedding_model
+from services.vector_store import qdrant_collection_config, vector_store
+from config import COLLECTION_NAME, VECTOR_STORE_BACKEND, STARTUP_RETRY_SECONDS, async_mongo_client, async_qdrant_client
+
+# Step name -> {"ready": bool, "error" or "seconds"}; read by the /readyz probe
+readiness: Dict[str, dict] = {}
+
+
+async def init_mongodb():
+    """Test the MongoDB connection and create the indexes the app relies on"""
+    await async_mongo_client.admin.command("ping")
+    print("✅ Successfully connected to MongoDB!")
+
+    db = async_mongo_client.rag_system
+    await asyncio.gather(
+        db.documents.create_index("document_id", unique=True),
+        db.documents.create_index("filename"),
+        db.documents.create_index("content_hash"),
+        db.documents.create_index([("upload_timestamp", -1), ("document_id", -1)]),
+        db.conversations.create_index("user_id"),
+        db.conversations.create_index("timestamp"),
+        db.conversations.create_index([("user_id", 1), ("timestamp", -1), ("_id", -1)]),
+        db.conversation_summaries.create_index("user_id", unique=True),
+    )
+    print("✅ MongoDB indexes created successfully!")
+
+
+async def init_vector_store():
+    """Create the Qdrant collection if it does not exist and check it matches the model"""
+    if VECTOR_STORE_BACKEND != "qdrant":
+        print("✅ Using in-process local vector store.")
+        return
+
+    # Waits for the model load running in parallel, which owns the vector size
+    vector_size = await run_in_threadpool(embedding_dimension)
+    if not await async_qdrant_client.collection_exists(COLLECTION_NAME):
+        await async_qdrant_client.create_collection(
+            collection_name=COLLECTION_NAME,
+            **qdrant_collection_config(vector_size)  # vector size, quantization, on-disk and HNSW settings
+        )
+        print(f"✅ Qdrant collection '{COLLECTION_NAME}' created successfully!")
+    else:
+        print(f"✅ Qdrant collection '{COLLECTION_NAME}' already exists!")
+    await vector_store.create_payload_indexes()
+    print("✅ Qdrant payload indexes on document_id and filename are in place!")
+
+    collection_info = await async_qdrant_client.get_collection(COLLECTION_NAME)
+    print(f"✅ Qdrant connection successful! Collection has {collection_info.points_count} points.")
+    if collection_info.config.params.vectors.size != vector_size:
+        print(f"⚠️ Collection vector size {collection_info.config.params.vectors.size} does not match "
+              f"the embedding model ({vector_size}); clear the collection and re-upload documents.")
+
+
+async def init_embedding_model():
+    """Load the embedding model and run a dummy batch through it"""
+    await run_in_threadpool(warm_up_embedding_model)
+
+
+STARTUP_STEPS = {
+    "mongodb": init_mongodb,
+    "vector_store": init_vector_store,
+    "embedding_model": init_embedding_model,
+}
+
+
+async def _run_step(name: str, step):
+    while True:
+        started = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            readiness[name] = {"ready": False, "error": str(e)}
+            print(f"❌ Startup step '{name}' failed: {e} (retrying in {STARTUP_RETRY_SECONDS:g}s)")
+            await asyncio.sleep(STARTUP_RETRY_SECONDS)
+            continue
+        readiness[name] = {"ready": True, "seconds": round(time.perf_counter() - started, 3)}
+        return
+
+
+async def initialize_services():
+    """Run the independent startup steps concurrently, retrying each one until it succeeds"""
+    for name in STARTUP_STEPS:
+        readiness[name] = {"ready": False, "error": None}
+    started = time.perf_counter()
+    await asyncio.gather(*(_run_step(name, step) for name, step in STARTUP_STEPS.items()))
+    print(f"✅ All services ready in {time.perf_counter() - started:.2f}s")
+
+
+def is_ready() -> bool:
+    return bool(readiness) and all(step["ready"] for step in readiness.values())
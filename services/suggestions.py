@@ -0,0 +1,121 @@
+# suggestions.py
+import asyncio
+from typing import List, Tuple
+import numpy as np
+from services.embeddings import aencode, normalize_text
+from services.metrics import CHUNK_SUGGESTIONS, SUGGESTION_QUEUE, detach_trace
+from services.vector_store import SearchHit, vector_store
+from utils.util_module import generate_chunk_suggestions
+from config import SUGGESTION_RANKING, SUGGESTION_WORKERS, SUGGESTION_QUEUE_SIZE
+
+SUGGESTION_COUNT = 3
+# Candidates this close to the current question ask the same thing again
+DUPLICATE_SIMILARITY = 0.9
+
+
+class SuggestionWorker:
+    """
+    Background generation of follow-up questions for newly ingested chunks.
+    Chunks queued by the ingestion pipeline are handled by `workers`
+    concurrent Ollama calls and the questions are merged into the chunk's
+    payload under `suggestions`. Ingestion never waits on it: chunks arriving
+    while `max_queued` are waiting are skipped (and counted) instead.
+    """
+
+    def __init__(self, workers: int = 1, max_queued: int = 10000):
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._tasks: List[asyncio.Task] = []
+
+    def _ensure_workers(self):
+        self._tasks = [task for task in self._tasks if not task.done()]
+        loop = asyncio.get_running_loop()
+        while len(self._tasks) < self.workers:
+            self._tasks.append(loop.create_task(self._run()))
+
+    def submit(self, chunks: List[Tuple[str, str]]) -> int:
+        """Queue (chunk_id, text) pairs; returns how many were skipped because the queue is full"""
+        self._ensure_workers()
+        skipped = 0
+        for chunk in chunks:
+            try:
+                self._queue.put_nowait(chunk)
+            except asyncio.QueueFull:
+                skipped += 1
+        if skipped:
+            CHUNK_SUGGESTIONS.labels("skipped").inc(skipped)
+        SUGGESTION_QUEUE.set(self._queue.qsize())
+        return skipped
+
+    async def _run(self):
+        detach_trace()
+        while True:
+            chunk_id, text = await self._queue.get()
+            SUGGESTION_QUEUE.set(self._queue.qsize())
+            try:
+                suggestions = await generate_chunk_suggestions(text)
+                if suggestions:
+                    # Skipped by the store when the chunk was deleted in the meantime
+                    await vector_store.set_payload(chunk_id, {"suggestions": suggestions})
+                CHUNK_SUGGESTIONS.labels("generated" if suggestions else "empty").inc()
+            except Exception as e:
+                CHUNK_SUGGESTIONS.labels("failed").inc()
+                print(f"⚠️ Failed to generate suggestions for chunk {chunk_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def drain(self):
+        """Wait until every queued chunk has been handled"""
+        if self._queue.qsize():
+            self._ensure_workers()
+        await self._queue.join()
+
+    def discard(self):
+        """Drop queued chunks, e.g. when all documents are deleted"""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self._queue.task_done()
+        SUGGESTION_QUEUE.set(0)
+
+    async def close(self):
+        """Stop the workers; chunks still queued are left for a backfill"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+suggestion_worker = SuggestionWorker(workers=SUGGESTION_WORKERS, max_queued=SUGGESTION_QUEUE_SIZE)
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+async def rank_suggestions(question: str, query_embedding, hits: List[SearchHit],
+                           limit: int = SUGGESTION_COUNT) -> List[str]:
+    """
+    Precomputed questions of the retrieved chunks, de-duplicated. With
+    SUGGESTION_RANKING they are ordered by embedding similarity to the current
+    question (their vectors usually come from the embedding cache), otherwise
+    they keep the chunks' rank order. Empty when no chunk has any yet.
+    """
+    seen = {normalize_text(question).lower()}
+    candidates = []
+    for hit in hits:
+        for suggestion in hit.payload.get("suggestions") or []:
+            key = normalize_text(suggestion).lower()
+            if key and key not in seen:
+                seen.add(key)
+                candidates.append(suggestion)
+    if not SUGGESTION_RANKING or len(candidates) <= 1:
+        return candidates[:limit]
+
+    vectors = _unit(np.asarray(await aencode(candidates), dtype=np.float32))
+    scores = vectors @ _unit(np.asarray(query_embedding, dtype=np.float32))
+    ranked = [candidates[i] for i in np.argsort(-scores) if scores[i] < DUPLICATE_SIMILARITY]
+    return ranked[:limit]
@@ -0,0 +1,619 @@
+# vector_store.py
+import os
+import json
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+import numpy as np
+from qdrant_client.http import models
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    COLLECTION_NAME, VECTOR_STORE_BACKEND, LOCAL_VECTOR_DIR, LOCAL_VECTOR_DTYPE,
+    LOCAL_VECTOR_IVF_LISTS, LOCAL_VECTOR_IVF_PROBES, QDRANT_QUANTIZATION, QDRANT_QUANTIZATION_ALWAYS_RAM,
+    QDRANT_ON_DISK, QDRANT_HNSW_M, QDRANT_HNSW_EF_CONSTRUCT, QDRANT_HNSW_EF, QDRANT_RESCORE,
+    QDRANT_OVERSAMPLING, async_qdrant_client
+)
+from services.embeddings import embedding_dimension
+
+
+@dataclass
+class VectorPoint:
+    id: str
+    vector: List[float]
+    payload: Dict[str, Any]
+
+
+@dataclass
+class SearchHit:
+    id: str
+    score: float
+    payload: Dict[str, Any]
+
+
+@dataclass
+class SearchFilter:
+    """Restricts a search to chunks of the given documents and/or filename (both must match when set)"""
+    document_ids: Optional[List[str]] = None
+    filename: Optional[str] = None
+
+    def matches(self, payload: Dict[str, Any]) -> bool:
+        if self.document_ids is not None and payload.get("document_id") not in self.document_ids:
+            return False
+        if self.filename is not None and payload.get("filename") != self.filename:
+            return False
+        return True
+
+
+# Payload fields used by per-document deletes and filtered search
+PAYLOAD_INDEXES = {
+    "document_id": models.PayloadSchemaType.KEYWORD,
+    "filename": models.PayloadSchemaType.KEYWORD,
+}
+
+
+class VectorStore(ABC):
+    """Operations the app needs from a vector index, independent of the backend"""
+
+    @abstractmethod
+    async def recreate(self):
+        """Drop all points and start from an empty collection"""
+
+    @abstractmethod
+    async def upsert(self, points: List[VectorPoint], wait: bool = True):
+        ...
+
+    async def create_payload_indexes(self):
+        """Index the PAYLOAD_INDEXES fields, for backends that need it"""
+
+    @abstractmethod
+    async def search(self, vector: List[float], limit: int, hnsw_ef: Optional[int] = None,
+                     oversampling: Optional[float] = None,
+                     search_filter: Optional[SearchFilter] = None) -> List[SearchHit]:
+        """Nearest points, optionally filtered; tuning knobs a backend does not support are ignored"""
+
+    async def search_batch(self, vectors: List[List[float]], limit: int, hnsw_ef: Optional[int] = None,
+                           oversampling: Optional[float] = None,
+                           search_filter: Optional[SearchFilter] = None) -> List[List[SearchHit]]:
+        """search() for many query vectors; backends with a batch API answer them in one round trip"""
+        return [await self.search(vector, limit, hnsw_ef, oversampling, search_filter) for vector in vectors]
+
+    @abstractmethod
+    async def retrieve(self, ids: List[str]) -> List[SearchHit]:
+        """Fetch stored points (with payload) by ID; missing IDs are skipped"""
+
+    @abstractmethod
+    async def set_payload(self, point_id: str, payload: Dict[str, Any]):
+        """Merge fields into a stored point's payload; a missing point is skipped"""
+
+    @abstractmethod
+    async def delete_ids(self, ids: List[str]):
+        ...
+
+    @abstractmethod
+    async def delete_document(self, document_id: str):
+        ...
+
+    @abstractmethod
+    async def document_chunk_ids(self, document_id: str) -> Set[str]:
+        """IDs of all points currently stored for a document"""
+
+    @abstractmethod
+    async def count(self) -> int:
+        ...
+
+
+def qdrant_quantization_config():
+    """Quantization settings for the configured QDRANT_QUANTIZATION, or None when disabled"""
+    if QDRANT_QUANTIZATION == "scalar":
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8,
+            quantile=0.99,
+            always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM
+        ))
+    if QDRANT_QUANTIZATION == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(
+            always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM
+        ))
+    if QDRANT_QUANTIZATION not in ("", "none"):
+        raise ValueError(f"Unknown QDRANT_QUANTIZATION '{QDRANT_QUANTIZATION}', expected none, scalar or binary")
+    return None
+
+
+def qdrant_collection_config(vector_size: Optional[int] = None) -> dict:
+    """
+    create_collection() keyword arguments built from the Qdrant storage settings
+    in config; the vector size defaults to the embedding model's output size.
+    """
+    return {
+        "vectors_config": models.VectorParams(
+            size=vector_size or embedding_dimension(),
+            distance=models.Distance.COSINE,
+            on_disk=QDRANT_ON_DISK
+        ),
+        "hnsw_config": models.HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT),
+        "quantization_config": qdrant_quantization_config(),
+    }
+
+
+def qdrant_search_params(hnsw_ef: Optional[int] = None, oversampling: Optional[float] = None):
+    """Per-query search params; request values fall back to the configured defaults"""
+    hnsw_ef = hnsw_ef or QDRANT_HNSW_EF or None
+    quantization = None
+    if QDRANT_QUANTIZATION not in ("", "none"):
+        quantization = models.QuantizationSearchParams(
+            rescore=QDRANT_RESCORE,
+            oversampling=oversampling or QDRANT_OVERSAMPLING
+        )
+    if hnsw_ef is None and quantization is None:
+        return None
+    return models.SearchParams(hnsw_ef=hnsw_ef, quantization=quantization)
+
+
+def _document_filter(document_id: str) -> models.Filter:
+    return models.Filter(must=[
+        models.FieldCondition(key="document_id", match=models.MatchValue(value=document_id))
+    ])
+
+
+def _qdrant_filter(search_filter: Optional[SearchFilter]) -> Optional[models.Filter]:
+    if search_filter is None:
+        return None
+    conditions = []
+    if search_filter.document_ids is not None:
+        conditions.append(models.FieldCondition(key="document_id", match=models.MatchAny(any=search_filter.document_ids)))
+    if search_filter.filename is not None:
+        conditions.append(models.FieldCondition(key="filename", match=models.MatchValue(value=search_filter.filename)))
+    return models.Filter(must=conditions) if conditions else None
+
+
+class QdrantVectorStore(VectorStore):
+    """Remote Qdrant collection"""
+
+    DELETE_BATCH_SIZE = 1000
+    SEARCH_BATCH_SIZE = 256
+
+    def __init__(self, client, collection_name: str):
+        self.client = client
+        self.collection_name = collection_name
+
+    async def recreate(self):
+        vector_size = await run_in_threadpool(embedding_dimension)
+        await self.client.delete_collection(self.collection_name)
+        await self.client.create_collection(
+            collection_name=self.collection_name,
+            **qdrant_collection_config(vector_size)
+        )
+        await self.create_payload_indexes()
+
+    async def create_payload_indexes(self):
+        for field_name, schema in PAYLOAD_INDEXES.items():
+            await self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name=field_name,
+                field_schema=schema
+            )
+
+    async def upsert(self, points: List[VectorPoint], wait: bool = True):
+        await self.client.upsert(
+            collection_name=self.collection_name,
+            points=[models.PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points],
+            wait=wait
+        )
+
+    async def search(self, vector: List[float], limit: int, hnsw_ef: Optional[int] = None,
+                     oversampling: Optional[float] = None,
+                     search_filter: Optional[SearchFilter] = None) -> List[SearchHit]:
+        response = await self.client.query_points(
+            collection_name=self.collection_name,
+            query=vector,
+            query_filter=_qdrant_filter(search_filter),
+            limit=limit,
+            search_params=qdrant_search_params(hnsw_ef, oversampling),
+            with_payload=True
+        )
+        return [SearchHit(id=str(r.id), score=r.score, payload=r.payload) for r in response.points]
+
+    async def search_batch(self, vectors: List[List[float]], limit: int, hnsw_ef: Optional[int] = None,
+                           oversampling: Optional[float] = None,
+                           search_filter: Optional[SearchFilter] = None) -> List[List[SearchHit]]:
+        # One query_batch_points request per SEARCH_BATCH_SIZE vectors keeps request bodies bounded
+        query_filter = _qdrant_filter(search_filter)
+        params = qdrant_search_params(hnsw_ef, oversampling)
+        results = []
+        for start in range(0, len(vectors), self.SEARCH_BATCH_SIZE):
+            responses = await self.client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=[
+                    models.QueryRequest(query=vector, filter=query_filter, limit=limit, params=params, with_payload=True)
+                    for vector in vectors[start:start + self.SEARCH_BATCH_SIZE]
+                ]
+            )
+            results.extend(
+                [SearchHit(id=str(r.id), score=r.score, payload=r.payload) for r in response.points]
+                for response in responses
+            )
+        return results
+
+    async def retrieve(self, ids: List[str]) -> List[SearchHit]:
+        if not ids:
+            return []
+        records = await self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=ids,
+            with_payload=True,
+            with_vectors=False
+        )
+        return [SearchHit(id=str(r.id), score=0.0, payload=r.payload) for r in records]
+
+    async def set_payload(self, point_id: str, payload: Dict[str, Any]):
+        # A filter selector matches nothing for a deleted point, where an ID list would fail
+        await self.client.set_payload(
+            collection_name=self.collection_name,
+            payload=payload,
+            points=models.Filter(must=[models.HasIdCondition(has_id=[point_id])]),
+            wait=False
+        )
+
+    async def delete_ids(self, ids: List[str]):
+        for start in range(0, len(ids), self.DELETE_BATCH_SIZE):
+            await self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=ids[start:start + self.DELETE_BATCH_SIZE])
+            )
+
+    async def delete_document(self, document_id: str):
+        await self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(filter=_document_filter(document_id))
+        )
+
+    async def document_chunk_ids(self, document_id: str) -> Set[str]:
+        chunk_ids = set()
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=_document_filter(document_id),
+                limit=1000,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            chunk_ids.update(str(point.id) for point in points)
+            if offset is None:
+                return chunk_ids
+
+    async def count(self) -> int:
+        return (await self.client.count(collection_name=self.collection_name)).count
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector index for small corpora and tests.
+    Normalized vectors live in a memory-mapped float32/float16 file (or in
+    RAM when no directory is given) and are searched with a vectorized dot
+    product and argpartition top-k. With `ivf_lists` > 0 the rows are also
+    partitioned by k-means so a search only scans the `ivf_probes` closest
+    partitions.
+    """
+
+    MIN_CAPACITY = 1024
+    IVF_MIN_POINTS = 4096  # below this a full scan is already sub-millisecond
+    IVF_TRAIN_ITERATIONS = 10
+
+    def __init__(self, directory: Optional[str] = None, dtype: str = "float32",
+                 ivf_lists: int = 0, ivf_probes: int = 8):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self._lock = asyncio.Lock()
+        self._reset()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    # -- storage -------------------------------------------------------------
+    # Vectors are written in place in the memory-mapped file; ids and payloads
+    # go to an append-only operation log that is replayed (and compacted) on load.
+
+    @property
+    def _log_path(self):
+        return os.path.join(self.directory, "points.jsonl")
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.directory, f"vectors.{self.dtype.name}")
+
+    def _reset(self):
+        self.dim: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._alive: Optional[np.ndarray] = None
+        self._ids: List[Optional[str]] = []  # row -> point id (None for a free row)
+        self._payloads: List[Optional[dict]] = []
+        self._rows: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        self._doc_rows: Dict[str, Set[int]] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._row_list: Optional[np.ndarray] = None
+        self._trained_at = 0
+        self._pending_ops: List[dict] = []
+
+    def _allocate(self, capacity: int):
+        old_vectors, old_alive = self._vectors, self._alive
+        if self.directory:
+            if old_vectors is not None:
+                old_vectors.flush()
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * self.dim * self.dtype.itemsize)
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+        else:
+            self._vectors = np.zeros((capacity, self.dim), dtype=self.dtype)
+            if old_vectors is not None:
+                self._vectors[:old_vectors.shape[0]] = old_vectors
+        self._alive = np.zeros(capacity, dtype=bool)
+        if old_alive is not None:
+            self._alive[:old_alive.shape[0]] = old_alive
+        if self._row_list is not None:
+            row_list = np.full(capacity, -1, dtype=np.int32)
+            row_list[:self._row_list.shape[0]] = self._row_list
+            self._row_list = row_list
+
+    def _load(self):
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path) as f:
+            ops = [json.loads(line) for line in f if line.strip()]
+        for op in ops:
+            if op["op"] == "dim":
+                self.dim = op["dim"]
+            elif op["op"] == "put":
+                row = op["row"]
+                while len(self._ids) <= row:
+                    self._ids.append(None)
+                    self._payloads.append(None)
+                self._ids[row] = op["id"]
+                self._payloads[row] = op["payload"]
+            elif op["op"] == "del":
+                self._ids[op["row"]] = None
+                self._payloads[op["row"]] = None
+        if self.dim is None:
+            return
+
+        self._allocate(max(len(self._ids), self.MIN_CAPACITY))
+        for row, point_id in enumerate(self._ids):
+            if point_id is None:
+                self._free_rows.append(row)
+            else:
+                self._index_row(row, point_id, self._payloads[row])
+        if len(ops) > 2 * len(self._rows) + self.MIN_CAPACITY:
+            self._compact_log()
+        self._train_ivf()
+
+    def _compact_log(self):
+        tmp_path = self._log_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps({"op": "dim", "dim": self.dim}) + "\n")
+            for row, point_id in enumerate(self._ids):
+                if point_id is not None:
+                    f.write(json.dumps({"op": "put", "row": row, "id": point_id, "payload": self._payloads[row]}) + "\n")
+        os.replace(tmp_path, self._log_path)
+
+    def _append_log(self, lines: str):
+        with open(self._log_path, "a") as f:
+            f.write(lines)
+
+    async def _persist(self):
+        if not self.directory or not self._pending_ops:
+            self._pending_ops = []
+            return
+        self._vectors.flush()
+        lines = "".join(json.dumps(op) + "\n" for op in self._pending_ops)
+        self._pending_ops = []
+        await run_in_threadpool(self._append_log, lines)
+
+    # -- bookkeeping ---------------------------------------------------------
+
+    def _index_row(self, row: int, point_id: str, payload: dict):
+        self._rows[point_id] = row
+        self._alive[row] = True
+        document_id = payload.get("document_id")
+        if document_id is not None:
+            self._doc_rows.setdefault(document_id, set()).add(row)
+
+    def _remove_row(self, row: int):
+        point_id = self._ids[row]
+        del self._rows[point_id]
+        document_id = (self._payloads[row] or {}).get("document_id")
+        if document_id in self._doc_rows:
+            self._doc_rows[document_id].discard(row)
+            if not self._doc_rows[document_id]:
+                del self._doc_rows[document_id]
+        self._ids[row] = None
+        self._payloads[row] = None
+        self._alive[row] = False
+        if self._row_list is not None:
+            self._row_list[row] = -1
+        self._free_rows.append(row)
+        self._pending_ops.append({"op": "del", "row": row})
+
+    def _next_row(self) -> int:
+        if self._free_rows:
+            return self._free_rows.pop()
+        row = len(self._ids)
+        if row >= self._vectors.shape[0]:
+            self._allocate(self._vectors.shape[0] * 2)
+        self._ids.append(None)
+        self._payloads.append(None)
+        return row
+
+    # -- IVF -----------------------------------------------------------------
+
+    def _live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self._alive[:len(self._ids)])
+
+    def _train_ivf(self):
+        live = self._live_rows()
+        if self.ivf_lists <= 0 or len(live) < max(self.IVF_MIN_POINTS, self.ivf_lists):
+            self._centroids = None
+            self._row_list = None
+            return
+        data = self._vectors[live].astype(np.float32)
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(data), self.ivf_lists, replace=False)]
+        for _ in range(self.IVF_TRAIN_ITERATIONS):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for k in range(self.ivf_lists):
+                members = data[assignment == k]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[k] = centroid / (np.linalg.norm(centroid) or 1.0)
+        self._centroids = centroids
+        self._row_list = np.full(self._alive.shape[0], -1, dtype=np.int32)
+        self._row_list[live] = np.argmax(data @ centroids.T, axis=1)
+        self._trained_at = len(live)
+
+    def _assign_ivf(self, rows: List[int]):
+        if self._centroids is None:
+            if self.ivf_lists > 0 and len(self._rows) >= max(self.IVF_MIN_POINTS, self.ivf_lists):
+                self._train_ivf()
+            return
+        if len(self._rows) >= 2 * self._trained_at:
+            # Retrain once the collection has doubled since the last training
+            self._train_ivf()
+            return
+        vectors = self._vectors[rows].astype(np.float32)
+        self._row_list[rows] = np.argmax(vectors @ self._centroids.T, axis=1)
+
+    # -- VectorStore ---------------------------------------------------------
+
+    async def recreate(self):
+        async with self._lock:
+            self._reset()
+            if self.directory:
+                for path in (self._log_path, self._vectors_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    async def upsert(self, points: List[VectorPoint], wait: bool = True):
+        if not points:
+            return
+        async with self._lock:
+            if self.dim is None:
+                self.dim = len(points[0].vector)
+                self._allocate(self.MIN_CAPACITY)
+                self._pending_ops.append({"op": "dim", "dim": self.dim})
+
+            vectors = np.asarray([p.vector for p in points], dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1.0, norms)
+
+            rows = []
+            for point, vector in zip(points, vectors):
+                row = self._rows.get(point.id)
+                if row is not None:
+                    self._remove_row(row)
+                row = self._next_row()
+                self._vectors[row] = vector
+                self._ids[row] = point.id
+                self._payloads[row] = point.payload
+                self._index_row(row, point.id, point.payload)
+                self._pending_ops.append({"op": "put", "row": row, "id": point.id, "payload": point.payload})
+                rows.append(row)
+            self._assign_ivf(rows)
+            await self._persist()
+
+    def _filtered_rows(self, search_filter: SearchFilter) -> np.ndarray:
+        if search_filter.document_ids is not None:
+            rows = {row for document_id in search_filter.document_ids for row in self._doc_rows.get(document_id, ())}
+        else:
+            rows = self._live_rows().tolist()
+        return np.asarray(sorted(row for row in rows if search_filter.matches(self._payloads[row])), dtype=np.int64)
+
+    async def search(self, vector: List[float], limit: int, hnsw_ef: Optional[int] = None,
+                     oversampling: Optional[float] = None,
+                     search_filter: Optional[SearchFilter] = None) -> List[SearchHit]:
+        if not self._rows or limit <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        n = len(self._ids)
+        if search_filter is not None:
+            # Exact scan over the matching rows; filtered sets are usually small
+            candidates = self._filtered_rows(search_filter)
+            if len(candidates) == 0:
+                return []
+            scores = np.asarray(self._vectors[candidates], dtype=np.float32) @ query
+        elif self._centroids is not None:
+            probes = np.argsort(self._centroids @ query)[-self.ivf_probes:]
+            candidates = np.flatnonzero(np.isin(self._row_list[:n], probes))
+            if len(candidates) == 0:
+                return []
+            scores = np.asarray(self._vectors[candidates], dtype=np.float32) @ query
+        else:
+            # Full scan; free rows are masked out instead of gathered away
+            candidates = np.arange(n)
+            scores = np.asarray(self._vectors[:n], dtype=np.float32) @ query
+            scores[~self._alive[:n]] = -np.inf
+
+        k = min(limit, len(self._rows), len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            SearchHit(id=self._ids[candidates[i]], score=float(scores[i]), payload=self._payloads[candidates[i]])
+            for i in top
+            if self._ids[candidates[i]] is not None
+        ]
+
+    async def retrieve(self, ids: List[str]) -> List[SearchHit]:
+        return [
+            SearchHit(id=point_id, score=0.0, payload=self._payloads[self._rows[point_id]])
+            for point_id in ids
+            if point_id in self._rows
+        ]
+
+    async def set_payload(self, point_id: str, payload: Dict[str, Any]):
+        async with self._lock:
+            row = self._rows.get(point_id)
+            if row is None:
+                return
+            self._payloads[row] = {**self._payloads[row], **payload}
+            self._pending_ops.append({"op": "put", "row": row, "id": point_id, "payload": self._payloads[row]})
+            await self._persist()
+
+    async def delete_ids(self, ids: List[str]):
+        async with self._lock:
+            for point_id in ids:
+                row = self._rows.get(point_id)
+                if row is not None:
+                    self._remove_row(row)
+            await self._persist()
+
+    async def delete_document(self, document_id: str):
+        async with self._lock:
+            for row in list(self._doc_rows.get(document_id, ())):
+                self._remove_row(row)
+            await self._persist()
+
+    async def document_chunk_ids(self, document_id: str) -> Set[str]:
+        return {self._ids[row] for row in self._doc_rows.get(document_id, ())}
+
+    async def count(self) -> int:
+        return len(self._rows)
+
+
+def build_vector_store() -> VectorStore:
+    if VECTOR_STORE_BACKEND == "local":
+        return LocalVectorStore(
+            directory=LOCAL_VECTOR_DIR or None,
+            dtype=LOCAL_VECTOR_DTYPE,
+            ivf_lists=LOCAL_VECTOR_IVF_LISTS,
+            ivf_probes=LOCAL_VECTOR_IVF_PROBES
+        )
+    return QdrantVectorStore(async_qdrant_client, COLLECTION_NAME)
+
+
+vector_store = build_vector_store()
@@ -3,11 +3,20 @@
 Database Setup Script for RAG Q&A System
 This script initializes and tests connections to MongoDB Atlas and Qdrant Cloud
 """
+import sys
+import gzip
+import time
+import argparse
+import gridfs
 from qdrant_client.http import models
 from dotenv import load_dotenv
 from langchain_ollama import OllamaLLM
 from langchain_core.messages import SystemMessage, HumanMessage
-from config import  COLLECTION_NAME, mongo_client, qdrant_client
+from config import  COLLECTION_NAME, QDRANT_ON_DISK, mongo_client, qdrant_client
+from services.embeddings import embedding_dimension
+from services.vector_store import PAYLOAD_INDEXES, qdrant_collection_config
+from services.document_store import ORIGINALS_BUCKET, content_type_for
+from utils.util_module import generate_chunk_suggestions_sync
 
 # Load environment variables
 load_dotenv()
@@ -39,21 +48,20 @@ def setup_qdrant():
         collection_names = [col.name for col in collections.collections]
 
         if COLLECTION_NAME not in collection_names:
+            vector_size = embedding_dimension()
             # Create collection for document embeddings
             qdrant_client.create_collection(
                 collection_name=COLLECTION_NAME,
-                vectors_config=models.VectorParams(
-                    size=384,  # all-MiniLM-L6-v2 embedding size
-                    distance=models.Distance.COSINE
-                ),
+                **qdrant_collection_config(vector_size)  # vector size, quantization, on-disk and HNSW settings
             )
             print(f"✅ Qdrant collection '{COLLECTION_NAME}' created successfully!")
         else:
             print(f"✅ Qdrant collection '{COLLECTION_NAME}' already exists!")
+        create_payload_indexes()
 
         # Get collection info
         collection_info = qdrant_client.get_collection(COLLECTION_NAME)
-        print(f"📊 Qdrant Collection Stats:")
+        print("📊 Qdrant Collection Stats:")
         print(f"   - Points: {collection_info.points_count}")
         print(f"   - Vector size: {collection_info.config.params.vectors.size}")
         print(f"   - Distance metric: {collection_info.config.params.vectors.distance}")
@@ -65,6 +73,158 @@ def setup_qdrant():
         print("Please check your Qdrant URL and API key.")
         return False
 
+def create_payload_indexes():
+    """Keyword indexes on the payload fields used by per-document deletes and filtered search"""
+    for field_name, schema in PAYLOAD_INDEXES.items():
+        qdrant_client.create_payload_index(
+            collection_name=COLLECTION_NAME,
+            field_name=field_name,
+            field_schema=schema
+        )
+    print(f"✅ Payload indexes on {', '.join(PAYLOAD_INDEXES)} are in place!")
+
+def migrate_qdrant(poll_interval: float = 5.0):
+    """
+    Apply the configured quantization, on-disk and HNSW settings to the existing
+    collection. Qdrant rebuilds the segments in the background and keeps serving
+    reads and writes meanwhile, so the app does not need to be stopped.
+    """
+    print(f"🔄 Migrating Qdrant collection '{COLLECTION_NAME}'...")
+
+    try:
+        if not qdrant_client.collection_exists(COLLECTION_NAME):
+            print(f"❌ Collection '{COLLECTION_NAME}' does not exist; run setup without --migrate first.")
+            return False
+
+        vector_size = embedding_dimension()
+        collection_info = qdrant_client.get_collection(COLLECTION_NAME)
+        if collection_info.config.params.vectors.size != vector_size:
+            print(f"❌ Collection vector size {collection_info.config.params.vectors.size} does not match the "
+                  f"embedding model ({vector_size}); clear the collection and re-upload documents instead.")
+            return False
+
+        config = qdrant_collection_config(vector_size)
+        qdrant_client.update_collection(
+            collection_name=COLLECTION_NAME,
+            vectors_config={"": models.VectorParamsDiff(on_disk=QDRANT_ON_DISK)},
+            hnsw_config=config["hnsw_config"],
+            quantization_config=config["quantization_config"] or models.Disabled.DISABLED,
+        )
+        create_payload_indexes()
+        print("✅ New settings applied, waiting for segments to be rebuilt...")
+
+        # YELLOW is optimizing and GREY has optimizations pending that have not started yet;
+        # only GREEN means every segment has been rebuilt with the new settings
+        while True:
+            time.sleep(poll_interval)
+            collection_info = qdrant_client.get_collection(COLLECTION_NAME)
+            if collection_info.status == models.CollectionStatus.GREEN:
+                break
+            if collection_info.status == models.CollectionStatus.RED:
+                print("❌ Qdrant reported an error while rebuilding the collection (status RED).")
+                return False
+            print(f"⏳ Optimizing ({collection_info.status}): {collection_info.indexed_vectors_count or 0}/"
+                  f"{collection_info.points_count} vectors indexed")
+
+        params = collection_info.config
+        print("📊 Qdrant Collection Settings:")
+        print(f"   - Status: {collection_info.status}")
+        print(f"   - Vectors on disk: {params.params.vectors.on_disk}")
+        print(f"   - HNSW m / ef_construct: {params.hnsw_config.m} / {params.hnsw_config.ef_construct}")
+        print(f"   - Quantization: {params.quantization_config}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Qdrant migration failed: {e}")
+        return False
+
+def migrate_originals():
+    """
+    Move file contents still stored inline in document metadata (`original_content`)
+    into the gzip-compressed GridFS originals bucket, leaving a reference behind.
+    """
+    print("🔄 Moving inline document contents to GridFS...")
+
+    try:
+        db = mongo_client.rag_system
+        bucket = gridfs.GridFSBucket(db, bucket_name=ORIGINALS_BUCKET)
+        moved = dropped = 0
+        for doc in db.documents.find({"original_content": {"$exists": True}},
+                                     {"document_id": 1, "filename": 1, "content_hash": 1, "original_content": 1}):
+            update = {"$unset": {"original_content": ""}}
+            if doc["filename"].endswith(".pdf"):
+                # Only a placeholder was stored for PDFs
+                dropped += 1
+            else:
+                raw = doc["original_content"].encode("utf-8")
+                compressed = gzip.compress(raw)
+                file_id = bucket.upload_from_stream(doc["filename"], compressed, metadata={
+                    "document_id": doc["document_id"],
+                    "content_hash": doc.get("content_hash"),
+                    "encoding": "gzip",
+                    "content_type": content_type_for(doc["filename"])
+                })
+                update["$set"] = {
+                    "original_file_id": file_id,
+                    "original_size": len(raw),
+                    "original_encoding": "gzip",
+                    "stored_size": len(compressed)
+                }
+                moved += 1
+            db.documents.update_one({"_id": doc["_id"]}, update)
+
+        print(f"✅ Moved {moved} originals to GridFS and dropped {dropped} PDF placeholders.")
+        return True
+
+    except Exception as e:
+        print(f"❌ Originals migration failed: {e}")
+        return False
+
+def backfill_suggestions(batch_size: int = 64):
+    """
+    Generate follow-up questions for chunks that have none in their payload yet,
+    e.g. ones ingested before CHUNK_SUGGESTIONS or skipped while the queue was full.
+    """
+    print("🔄 Generating follow-up questions for chunks without suggestions...")
+
+    try:
+        missing = models.Filter(must=[models.IsEmptyCondition(is_empty=models.PayloadField(key="suggestions"))])
+        generated = failed = 0
+        offset = None
+        while True:
+            points, offset = qdrant_client.scroll(
+                collection_name=COLLECTION_NAME,
+                scroll_filter=missing,
+                limit=batch_size,
+                offset=offset,
+                with_payload=["text"],
+                with_vectors=False
+            )
+            for point in points:
+                try:
+                    suggestions = generate_chunk_suggestions_sync(point.payload["text"])
+                except Exception as e:
+                    print(f"⚠️ Chunk {point.id}: {e}")
+                    failed += 1
+                    continue
+                if suggestions:
+                    qdrant_client.set_payload(
+                        collection_name=COLLECTION_NAME,
+                        payload={"suggestions": suggestions},
+                        points=[point.id]
+                    )
+                    generated += 1
+            print(f"⏳ {generated} chunks done, {failed} failed")
+            if offset is None:
+                break
+
+        print(f"✅ Stored suggestions for {generated} chunks ({failed} failed).")
+        return True
+
+    except Exception as e:
+        print(f"❌ Suggestion backfill failed: {e}")
+        return False
+
 def test_ollama():
     """Test Ollama API connection"""
     print("🔄 Testing Ollama API...")
@@ -99,6 +259,22 @@ def test_ollama():
 
 def main():
     """Main setup function"""
+    parser = argparse.ArgumentParser(description="Initialize and test the RAG Q&A system services.")
+    parser.add_argument("--migrate", action="store_true",
+                        help="apply the configured Qdrant quantization/on-disk/HNSW settings to the existing collection")
+    parser.add_argument("--migrate-originals", action="store_true",
+                        help="move original file contents stored inline in MongoDB documents to GridFS")
+    parser.add_argument("--backfill-suggestions", action="store_true",
+                        help="generate follow-up questions for Qdrant chunks that have none stored yet")
+    args = parser.parse_args()
+
+    if args.migrate:
+        sys.exit(0 if migrate_qdrant() else 1)
+    if args.migrate_originals:
+        sys.exit(0 if migrate_originals() else 1)
+    if args.backfill_suggestions:
+        sys.exit(0 if backfill_suggestions() else 1)
+
     print("🚀 RAG Q&A System Database Setup")
     print("=" * 50)
     
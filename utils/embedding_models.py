@@ -0,0 +1,62 @@
+# embedding_models.py
+# Model loading only, without app state, so scripts can load several runtimes side by side.
+# sentence_transformers (and torch) are imported on first load to keep app import time low.
+import os
+from typing import Optional
+
+EMBEDDING_RUNTIMES = ("torch", "onnx", "onnx-int8")
+ONNX_MODEL_FILE = os.path.join("onnx", "model.onnx")
+
+
+def ensure_model_downloaded(model_name: str, model_path: str):
+    """
+    Ensure that the embedding model is downloaded locally.
+    If not found, it downloads and saves the model.
+    """
+    if not os.path.exists(model_path):
+        from sentence_transformers import SentenceTransformer
+
+        print(f"📥 Downloading model '{model_name}' to '{model_path}' ...")
+        model = SentenceTransformer(model_name)
+        model.save(model_path)
+        print("✅ Model downloaded and saved locally.")
+    else:
+        print("✅ Model already exists locally.")
+
+
+def ensure_onnx_exported(model_path: str, quantization: Optional[str] = None) -> str:
+    """
+    Export the local model to ONNX (and optionally a dynamically quantized
+    int8 copy) next to the PyTorch weights, once. Returns the ONNX file name
+    relative to `model_path`.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if not os.path.exists(os.path.join(model_path, ONNX_MODEL_FILE)):
+        print(f"📦 Exporting '{model_path}' to ONNX ...")
+        SentenceTransformer(model_path, backend="onnx").save_pretrained(model_path)
+    if not quantization:
+        return ONNX_MODEL_FILE
+
+    quantized_file = os.path.join("onnx", f"model_qint8_{quantization}.onnx")
+    if not os.path.exists(os.path.join(model_path, quantized_file)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        print(f"📦 Quantizing ONNX model to int8 ({quantization}) ...")
+        onnx_model = SentenceTransformer(model_path, backend="onnx", model_kwargs={"file_name": ONNX_MODEL_FILE})
+        export_dynamic_quantized_onnx_model(onnx_model, quantization, model_path)
+    return quantized_file
+
+
+def load_embedding_model(model_path: str, runtime: str = "torch",
+                         quantization: str = "avx2"):
+    """Load the local SentenceTransformer on the requested runtime ("torch", "onnx" or "onnx-int8")"""
+    if runtime not in EMBEDDING_RUNTIMES:
+        raise ValueError(f"Unknown embedding runtime '{runtime}', expected one of {EMBEDDING_RUNTIMES}")
+    from sentence_transformers import SentenceTransformer
+
+    if runtime == "torch":
+        return SentenceTransformer(model_path)
+
+    file_name = ensure_onnx_exported(model_path, quantization if runtime == "onnx-int8" else None)
+    return SentenceTransformer(model_path, backend="onnx", model_kwargs={"file_name": file_name})
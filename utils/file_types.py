@@ -0,0 +1,5 @@
+# file_types.py
+# Kept free of app imports so the bulk upload client can use it without loading the services.
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt')
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
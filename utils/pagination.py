@@ -0,0 +1,37 @@
+# pagination.py
+import json
+import base64
+import datetime
+from typing import Any, Tuple
+from bson import ObjectId
+from fastapi import HTTPException
+
+
+def encode_cursor(timestamp: datetime.datetime, tie_breaker: Any) -> str:
+    """Opaque cursor for the position just after (timestamp, tie_breaker)"""
+    raw = json.dumps([timestamp.isoformat(), str(tie_breaker), isinstance(tie_breaker, ObjectId)])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, Any]:
+    try:
+        timestamp, tie_breaker, is_object_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (datetime.datetime.fromisoformat(timestamp),
+                ObjectId(tie_breaker) if is_object_id else tie_breaker)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(field: str, tie_field: str, cursor: str) -> dict:
+    """Match documents after the cursor in (field, tie_field) descending order"""
+    value, tie_value = decode_cursor(cursor)
+    return {"$or": [
+        {field: {"$lt": value}},
+        {field: value, tie_field: {"$lt": tie_value}}
+    ]}
+
+
+def is_after_cursor(doc: dict, field: str, tie_field: str, cursor: str) -> bool:
+    """In-memory counterpart of keyset_filter"""
+    value, tie_value = decode_cursor(cursor)
+    return (doc[field], doc[tie_field]) < (value, tie_value)
@@ -0,0 +1,152 @@
+# pdf_extraction.py
+# Kept free of app imports so process-pool workers start cheaply.
+import io
+import signal
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple, Union
+import PyPDF2
+
+PdfSource = Union[bytes, str]  # raw bytes or a file path
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class PageTimeout(Exception):
+    pass
+
+
+def _raise_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _open_reader(source: PdfSource) -> PyPDF2.PdfReader:
+    if isinstance(source, bytes):
+        return PyPDF2.PdfReader(io.BytesIO(source))
+    return PyPDF2.PdfReader(source)
+
+
+def count_pdf_pages(source: PdfSource) -> int:
+    return len(_open_reader(source).pages)
+
+
+def extract_page_range(source: PdfSource, start: int, end: int, page_timeout: float = 0) -> List[Tuple[str, int]]:
+    """
+    Extract pages [start, end) of a PDF, returning (text, page_number) pairs.
+    Runs inside a worker process: each call opens the document independently.
+    A page that takes longer than `page_timeout` seconds is skipped (empty text);
+    the timeout relies on SIGALRM and is ignored where that is unavailable.
+    """
+    reader = _open_reader(source)
+    use_alarm = page_timeout > 0 and hasattr(signal, "SIGALRM") \
+        and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_page_timeout)
+
+    pages_text = []
+    try:
+        for index in range(start, min(end, len(reader.pages))):
+            try:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                text = reader.pages[index].extract_text()
+            except PageTimeout:
+                text = ""
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+            pages_text.append((text, index + 1))
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous_handler)
+    return pages_text
+
+
+def get_pdf_executor(max_workers: int) -> Optional[Executor]:
+    """
+    Shared process pool for PDF extraction; None means extract in-process.
+    Workers are spawned rather than forked, since forking the multithreaded
+    server can deadlock a child on a lock held by another thread.
+    """
+    global _executor
+    if max_workers <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _discard_broken_executor(executor: Executor):
+    """Drop a pool whose worker died (e.g. on a crashing PDF) so the next extraction starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pdf_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def page_ranges(total_pages: int, pages_per_task: int) -> List[Tuple[int, int]]:
+    return [(start, min(start + pages_per_task, total_pages)) for start in range(0, total_pages, pages_per_task)]
+
+
+def extract_pages_parallel(source: PdfSource, total_pages: int, max_workers: int,
+                           pages_per_task: int, page_timeout: float) -> List[Tuple[str, int]]:
+    """Extract all pages across the process pool and merge them back in page order"""
+    executor = get_pdf_executor(max_workers)
+    if executor is None:
+        return extract_page_range(source, 0, total_pages, page_timeout)
+
+    try:
+        futures = [
+            executor.submit(extract_page_range, source, start, end, page_timeout)
+            for start, end in page_ranges(total_pages, pages_per_task)
+        ]
+        pages_text = []
+        for future in futures:
+            pages_text.extend(future.result())
+    except BrokenProcessPool:
+        _discard_broken_executor(executor)
+        raise
+    return pages_text
+
+
+async def aiter_pages_parallel(source: PdfSource, total_pages: int, max_workers: int,
+                               pages_per_task: int, page_timeout: float):
+    """
+    Yield (text, page_number) in page order while ranges are extracted in the
+    process pool. Only a bounded number of ranges are in flight at once.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_pdf_executor(max_workers)
+    ranges = page_ranges(total_pages, pages_per_task)
+    max_in_flight = max(1, max_workers) * 2
+
+    in_flight = []
+    next_range = 0
+    while next_range < len(ranges) or in_flight:
+        try:
+            while next_range < len(ranges) and len(in_flight) < max_in_flight:
+                start, end = ranges[next_range]
+                in_flight.append(loop.run_in_executor(executor, extract_page_range, source, start, end, page_timeout))
+                next_range += 1
+            pages = await in_flight.pop(0)
+        except BrokenProcessPool:
+            for future in in_flight:
+                future.cancel()
+            _discard_broken_executor(executor)
+            raise
+        for page in pages:
+            yield page
@@ -1,21 +1,24 @@
-import PyPDF2
-import io
+import json
 import logging
 from fastapi import  HTTPException
-from typing import List, Optional
-from services.ollama_service import ollama_response
+from typing import List, Optional, Tuple
+from services.ollama_service import ollama_response, aollama_response, aollama_json_response
+from utils.pdf_extraction import count_pdf_pages, extract_pages_parallel
+from config import PDF_EXTRACT_WORKERS, PDF_PAGES_PER_TASK, PDF_PAGE_TIMEOUT_SECONDS
 
 
 # Utility functions
 def extract_text_from_pdf(file_content: bytes) -> List[tuple]:
     """Extract text from PDF and return list of (text, page_number)"""
     try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        pages_text = []
-        for page_num, page in enumerate(pdf_reader.pages, 1):
-            text = page.extract_text()
-            pages_text.append((text, page_num))
-        return pages_text
+        total_pages = count_pdf_pages(file_content)
+        return extract_pages_parallel(
+            file_content,
+            total_pages,
+            max_workers=PDF_EXTRACT_WORKERS,
+            pages_per_task=PDF_PAGES_PER_TASK,
+            page_timeout=PDF_PAGE_TIMEOUT_SECONDS
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error extracting PDF: {str(e)}")
 
@@ -32,7 +35,18 @@ def chunk_text(text: str, chunk_size: int = 500, overlap: int = 80) -> List[str]
     return chunks
 
 
-def generate_suggestions(question: str, context: str) -> List[str]:
+DEFAULT_SUGGESTIONS = [
+    "Can you provide more details?",
+    "What are the implications?",
+    "Are there any examples?"
+]
+
+
+def _clean_suggestions(lines: List[str]) -> List[str]:
+    return [s.strip("-•123. ").strip() for s in lines if s and s.strip()][:3]
+
+
+async def generate_suggestions(question: str, context: str) -> List[str]:
     """Generate follow-up question suggestions using Ollama"""
     try:
         # Build prompt
@@ -40,15 +54,68 @@ def generate_suggestions(question: str, context: str) -> List[str]:
         user_prompt = f"Question: {question}\nContext: {context[:500]}"
 
         # Call Ollama
-        text = ollama_response(system_prompt, user_prompt)
+        text = await aollama_response(system_prompt, user_prompt, call="suggestions")
         
         # Split into lines and clean
         suggestions = text.strip().split("\n")
-        return [s.strip("-•123. ").strip() for s in suggestions if s.strip()][:3]
+        return _clean_suggestions(suggestions)
 
     except Exception:
-        return [
-            "Can you provide more details?",
-            "What are the implications?",
-            "Are there any examples?"
-        ]
\ No newline at end of file
+        return list(DEFAULT_SUGGESTIONS)
+
+
+CHUNK_SUGGESTIONS_PROMPT = "Generate 3 short questions a reader could ask about this passage that it answers. Return only the questions, one per line."
+
+
+async def generate_chunk_suggestions(chunk: str) -> List[str]:
+    """Generate questions a reader of a document chunk could ask next, for storing with the chunk"""
+    text = await aollama_response(CHUNK_SUGGESTIONS_PROMPT, f"Passage: {chunk}", call="chunk_suggestions",
+                                  background=True)
+    return _clean_suggestions(text.strip().split("\n"))
+
+
+def generate_chunk_suggestions_sync(chunk: str) -> List[str]:
+    """Blocking variant of generate_chunk_suggestions for scripts"""
+    text = ollama_response(CHUNK_SUGGESTIONS_PROMPT, f"Passage: {chunk}", call="chunk_suggestions")
+    return _clean_suggestions(text.strip().split("\n"))
+
+
+async def generate_reasoning(question: str, answer: str) -> str:
+    """Explain briefly how an answer was derived from the document context"""
+    reasoning_prompt = f"""Based on this question: "{question}" and the answer: "{answer}", 
+        explain briefly how you arrived at this answer using the provided document context."""
+    return await aollama_response(system_prompt="Provide brief reasoning for the given answer.", user_prompt=reasoning_prompt,
+                                  call="reasoning")
+
+
+async def generate_structured_answer(system_prompt: str, user_prompt: str,
+                                     with_suggestions: bool = True) -> Tuple[str, str, List[str]]:
+    """
+    Get answer, reasoning and follow-up questions from a single JSON generation.
+    Without `with_suggestions` the model is not asked for questions and none are returned.
+    """
+    keys = '"answer" (string), "reasoning" (string, brief explanation of how the context supports the answer)'
+    if with_suggestions:
+        keys += ',\n        "suggestions" (list of 3 short follow-up questions)'
+    structured_system_prompt = system_prompt + f"""
+        Respond with a JSON object with exactly these keys:
+        {keys}."""
+
+    text = await aollama_json_response(structured_system_prompt, user_prompt)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        # Model ignored the format; keep the raw output as the answer
+        return text.strip(), "", list(DEFAULT_SUGGESTIONS) if with_suggestions else []
+
+    answer = str(data.get("answer", "")).strip()
+    reasoning = str(data.get("reasoning", "")).strip()
+    if not with_suggestions:
+        return answer, reasoning, []
+    suggestions = data.get("suggestions") or []
+    if isinstance(suggestions, str):
+        suggestions = suggestions.split("\n")
+    suggestions = _clean_suggestions([str(s) for s in suggestions]) or list(DEFAULT_SUGGESTIONS)
+    return answer, reasoning, suggestions